@@ -0,0 +1,109 @@
+"""Check that the admin publishers and withdrawals pages cost a fixed number of queries.
+
+Seeds publishers, files, bank accounts and withdrawals inside a transaction that is
+rolled back at the end, and counts the statements each loader sends for 1 row and
+for many. Run it from the repository root against a scratch database:
+
+    DATABASE_URL=postgresql://... python -m benchmarks.admin_query_counts
+"""
+from asyncio import run
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.database import engine, run_migrations
+from bot.models import BankAccount, File, Publisher, WithdrawalRequest
+from bot.modules.queries import publishers_with_file_counts, withdrawal_status_counts, withdrawals_with_accounts
+
+SIZES = (1, 200)
+FILES_PER_PUBLISHER = 3
+
+@contextmanager
+def counting_statements():
+    counter = [0]
+
+    def count(*_):
+        counter[0] += 1
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', count)
+
+async def seed(session: AsyncSession, start: int, stop: int):
+    for n in range(start, stop):
+        publisher = Publisher(email=f'bench-{n}@example.com', password_hash='-', traffic_source='bench')
+        session.add(publisher)
+        await session.flush()
+
+        session.add_all([
+            File(
+                telegram_message_id=n,
+                filename=f'bench-{n}-{i}.mp4',
+                file_size=1,
+                mime_type='video/mp4',
+                access_code=f'bench{n:06d}{i:02d}',
+                publisher_id=publisher.id
+            )
+            for i in range(FILES_PER_PUBLISHER)
+        ])
+        account = BankAccount(
+            publisher_id=publisher.id,
+            account_holder_name='Bench',
+            bank_name='Bench',
+            account_number=str(n),
+            country='Bench'
+        )
+        session.add(account)
+        await session.flush()
+        session.add(WithdrawalRequest(publisher_id=publisher.id, bank_account_id=account.id, amount=1.0))
+
+    await session.flush()
+
+async def measure(session: AsyncSession) -> dict[str, int]:
+    counts = {}
+
+    with counting_statements() as counter:
+        await publishers_with_file_counts(session)
+    counts['publishers'] = counter[0]
+
+    with counting_statements() as counter:
+        await withdrawals_with_accounts(session)
+        await withdrawal_status_counts(session)
+    counts['withdrawals'] = counter[0]
+
+    return counts
+
+async def main() -> int:
+    await run_migrations()
+
+    results = {}
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        session = AsyncSession(bind=conn, expire_on_commit=False)
+        try:
+            seeded = 0
+            for size in SIZES:
+                await seed(session, seeded, size)
+                seeded = size
+                # Loaded rows would otherwise be served from the identity map
+                session.expunge_all()
+                results[size] = await measure(session)
+        finally:
+            await session.close()
+            await transaction.rollback()
+
+    await engine.dispose()
+
+    for size, counts in results.items():
+        print(f'{size:>5} rows: ' + ', '.join(f'{view} {count} queries' for view, count in counts.items()))
+
+    if len({tuple(counts.items()) for counts in results.values()}) != 1:
+        print('FAIL: query count grows with the number of rows')
+        return 1
+
+    print('OK: query count is independent of the number of rows')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(run(main()))
@@ -1,15 +1,17 @@
 from telethon import TelegramClient
 from logging import getLogger
 from logging.config import dictConfig
-from .config import Telegram, LOGGER_CONFIG_JSON
+from .config import Telegram, Server, LOGGER_CONFIG_JSON
 
 dictConfig(LOGGER_CONFIG_JSON)
 
 version = 1.6
 logger = getLogger('bot')
 
+# Web workers sign in with a session of their own and leave updates to the bot process
 TelegramBot = TelegramClient(
-    session='bot',
+    session='bot' if Server.WORKER_INDEX is None else f'web-{Server.WORKER_INDEX}',
     api_id=Telegram.API_ID,
-    api_hash=Telegram.API_HASH
+    api_hash=Telegram.API_HASH,
+    receive_updates=Server.WORKER_INDEX is None
 )
\ No newline at end of file
@@ -1,8 +1,9 @@
 from importlib import import_module
 from pathlib import Path
 from bot import TelegramBot, logger
-from bot.config import Telegram
+from bot.config import Telegram, Server
 from bot.server import server
+from bot.workers import start_bot_process, stop_bot_process
 import asyncio
 from datetime import datetime, timedelta
 from bot.database import AsyncSessionLocal
@@ -38,11 +39,19 @@ async def cleanup_old_play_counts():
 
 if __name__ == '__main__':
     logger.info('initializing...')
-    TelegramBot.loop.create_task(server.serve())
+    if Server.WEB_WORKERS:
+        # HTTP is served by separate worker processes; this one only runs the bot
+        TelegramBot.loop.run_until_complete(start_bot_process())
+    else:
+        TelegramBot.loop.create_task(server.serve())
     TelegramBot.loop.create_task(cleanup_old_play_counts())
     TelegramBot.start(bot_token=Telegram.BOT_TOKEN)
     logger.info('Telegram client is now started.')
     logger.info('Loading bot plugins...')
     load_plugins()
     logger.info('Bot is now ready!')
-    TelegramBot.run_until_disconnected()
\ No newline at end of file
+    try:
+        TelegramBot.run_until_disconnected()
+    finally:
+        if Server.WEB_WORKERS:
+            TelegramBot.loop.run_until_complete(stop_bot_process())
\ No newline at end of file
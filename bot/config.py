@@ -49,6 +49,57 @@ class Server:
     CALLBACK_API_URL = env.get("CALLBACK_API_URL")
     BIND_ADDRESS = env.get("BIND_ADDRESS") or "0.0.0.0"
     PORT = int(env.get("PORT") or "5000")
+    # Signs session cookies; set it so logins survive restarts and are accepted by every web worker
+    SECRET_KEY = env.get("SECRET_KEY")
+    # With WEB_WORKERS > 0 the bot runs in its own process and HTTP is served by that many worker
+    # processes sharing PORT; worker N also listens on 127.0.0.1:WORKER_PORT + N for its siblings
+    WEB_WORKERS = int(env.get("WEB_WORKERS") or "0")
+    WORKER_PORT = int(env.get("WORKER_PORT") or str(PORT + 1))
+    # Set by the bot process in each web worker it starts
+    WORKER_INDEX = int(env["WEB_WORKER_INDEX"]) if env.get("WEB_WORKER_INDEX") else None
+    # Number of 1 MiB chunk requests kept in flight per download
+    DOWNLOAD_WINDOW = int(env.get("DOWNLOAD_WINDOW") or "4")
+    # MiB that chunks fetched ahead of their readers may hold, across all downloads
+    READ_AHEAD_MEMORY = int(env.get("READ_AHEAD_MEMORY") or "256") * 1024 * 1024
+    # Extra bot tokens, comma separated, whose sessions share the download load; each bot must be a member of CHANNEL_ID
+    DOWNLOAD_BOT_TOKENS = [token.strip() for token in (env.get("DOWNLOAD_BOT_TOKENS") or "").split(",") if token.strip()]
+    # On-disk chunk cache for hot files, size in MiB (0 disables it)
+    CACHE_DIR = env.get("CACHE_DIR") or "cache"
+    CACHE_MAX_SIZE = int(env.get("CACHE_MAX_SIZE") or "1024") * 1024 * 1024
+    # Seconds a resolved channel message is reused before asking Telegram again
+    MESSAGE_CACHE_TTL = int(env.get("MESSAGE_CACHE_TTL") or "300")
+    MESSAGE_CACHE_SIZE = int(env.get("MESSAGE_CACHE_SIZE") or "10000")
+    # When set, /api/postback hands out HMAC-signed links instead of stored tokens
+    LINK_SIGNING_KEY = env.get("LINK_SIGNING_KEY")
+    # Access logs are queued in memory and written in batches
+    ACCESS_LOG_QUEUE_SIZE = int(env.get("ACCESS_LOG_QUEUE_SIZE") or "10000")
+    ACCESS_LOG_BATCH_SIZE = int(env.get("ACCESS_LOG_BATCH_SIZE") or "500")
+    ACCESS_LOG_FLUSH_INTERVAL = float(env.get("ACCESS_LOG_FLUSH_INTERVAL") or "2")
+    # Impression earnings are credited to publisher balances in periodic batches
+    SETTLEMENT_INTERVAL = float(env.get("SETTLEMENT_INTERVAL") or "10")
+    SETTLEMENT_BATCH_SIZE = int(env.get("SETTLEMENT_BATCH_SIZE") or "5000")
+    # Seconds between writes of the in-memory ad play counters
+    AD_COUNTER_FLUSH_INTERVAL = float(env.get("AD_COUNTER_FLUSH_INTERVAL") or "5")
+    # Each worker counts plays in memory only up to its WEB_WORKERS share of what is left under a daily
+    # limit, minus this many; further plays are checked against the limit and counted in the database.
+    # Plays another worker still holds in memory are not seen by that check, so a cap can be passed by those
+    AD_LIMIT_MARGIN = int(env.get("AD_LIMIT_MARGIN") or "3")
+    # Bytes of a streamed upload buffered in memory before reading from the client pauses
+    UPLOAD_BUFFER_SIZE = int(env.get("UPLOAD_BUFFER_SIZE") or str(4 * 1024 * 1024))
+    # Uploads send up to UPLOAD_WINDOW 512 KB parts at once over UPLOAD_CONNECTIONS extra connections
+    UPLOAD_CONNECTIONS = int(env.get("UPLOAD_CONNECTIONS") or "4")
+    UPLOAD_WINDOW = int(env.get("UPLOAD_WINDOW") or "8")
+    UPLOAD_RETRIES = int(env.get("UPLOAD_RETRIES") or "5")
+    # Resumable uploads are forgotten after this many idle seconds
+    UPLOAD_SESSION_TTL = int(env.get("UPLOAD_SESSION_TTL") or "3600")
+    UPLOAD_SESSION_LIMIT = int(env.get("UPLOAD_SESSION_LIMIT") or "100")
+    # Uploads finished in the background; results are kept for polling this many seconds
+    UPLOAD_JOB_CONCURRENCY = int(env.get("UPLOAD_JOB_CONCURRENCY") or "4")
+    UPLOAD_JOB_RETENTION = int(env.get("UPLOAD_JOB_RETENTION") or "3600")
+    # Link callbacks are delivered from the link_transactions outbox with retries
+    CALLBACK_TIMEOUT = float(env.get("CALLBACK_TIMEOUT") or "30")
+    CALLBACK_CONCURRENCY = int(env.get("CALLBACK_CONCURRENCY") or "20")
+    CALLBACK_MAX_ATTEMPTS = int(env.get("CALLBACK_MAX_ATTEMPTS") or "8")
 # LOGGING CONFIGURATION
 LOGGER_CONFIG_JSON = {
     'version': 1,
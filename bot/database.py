@@ -51,25 +51,33 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 async def create_default_admin():
-    """Create or update default admin account with current password"""
+    """Make sure the default admin account exists and is an active admin.
+
+    ADMIN_PASSWORD is hashed only when the account is created, or on a start with
+    ADMIN_RESET_PASSWORD=1, so routine restarts skip bcrypt entirely.
+    """
     from bot.models import Publisher
+    from sqlalchemy import select
     import bcrypt
     
     # Use default values if env vars are not set or empty
     default_admin_email = environ.get("ADMIN_EMAIL") or "admin@bot.com"
     default_admin_password = environ.get("ADMIN_PASSWORD") or "admin123"
+    reset_password = environ.get("ADMIN_RESET_PASSWORD", "").lower() in ("1", "true", "yes")
     
     async with AsyncSessionLocal() as session:
         try:
-            from sqlalchemy import select
-            
             result = await session.execute(
                 select(Publisher).where(Publisher.email == default_admin_email)
             )
             existing_admin = result.scalar_one_or_none()
             
-            salt = bcrypt.gensalt()
-            password_hash = bcrypt.hashpw(default_admin_password.encode('utf-8'), salt).decode('utf-8')
+            if existing_admin and existing_admin.is_admin and existing_admin.is_active and not reset_password:
+                return
+            
+            if not existing_admin or reset_password:
+                salt = bcrypt.gensalt()
+                password_hash = bcrypt.hashpw(default_admin_password.encode('utf-8'), salt).decode('utf-8')
             
             if not existing_admin:
                 admin = Publisher(
@@ -84,106 +92,63 @@ async def create_default_admin():
                 await session.commit()
                 logger.info(f"Default admin account created: {default_admin_email}")
             else:
-                existing_admin.password_hash = password_hash
+                if reset_password:
+                    existing_admin.password_hash = password_hash
                 existing_admin.is_admin = True
                 existing_admin.is_active = True
                 await session.commit()
-                logger.info(f"Admin account password updated: {default_admin_email}")
+                logger.info(f"Admin account restored: {default_admin_email}")
                 
         except Exception as e:
             await session.rollback()
             logger.error(f"Error creating/updating default admin: {e}")
 
+MIGRATIONS = Path(__file__).parent / 'migrations'
+# Held while upgrading so bot processes starting together do not migrate at once
+MIGRATION_LOCK = 7302561
+
+def _alembic_config():
+    from alembic.config import Config
+    
+    config = Config()
+    config.set_main_option('script_location', str(MIGRATIONS))
+    return config
+
+def _current_revisions(connection) -> set[str]:
+    from alembic.runtime.migration import MigrationContext
+    
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+def _upgrade(connection, config):
+    from alembic import command
+    
+    # Picked up by migrations/env.py instead of opening its own connection
+    config.attributes['connection'] = connection
+    command.upgrade(config, 'head')
+
 async def run_migrations():
-    """Run database migrations for schema changes"""
+    """Upgrade the schema to the newest revision in bot/migrations.
+
+    A database that is already current costs a single version lookup and no DDL.
+    """
+    from alembic.script import ScriptDirectory
     from sqlalchemy import text
     
+    config = _alembic_config()
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    
+    async with engine.connect() as conn:
+        if await conn.run_sync(_current_revisions) == heads:
+            logger.info("Database schema is up to date")
+            return
+    
     async with engine.begin() as conn:
-        try:
-            # Add android_package_name column if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE settings ADD COLUMN IF NOT EXISTS android_package_name VARCHAR(255)"
-            ))
-            # Add android_deep_link_scheme column if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE settings ADD COLUMN IF NOT EXISTS android_deep_link_scheme VARCHAR(100)"
-            ))
-            # Add minimum_withdrawal column if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE settings ADD COLUMN IF NOT EXISTS minimum_withdrawal FLOAT DEFAULT 10.0"
-            ))
-            # Add balance column to publishers table if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE publishers ADD COLUMN IF NOT EXISTS balance FLOAT DEFAULT 0.0"
-            ))
-            # Add ads_api_token column to settings if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE settings ADD COLUMN IF NOT EXISTS ads_api_token TEXT"
-            ))
-            # Add callback_mode column to settings if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE settings ADD COLUMN IF NOT EXISTS callback_mode VARCHAR(10) DEFAULT 'POST'"
-            ))
-            # Add callback_method column to link_transactions if it doesn't exist
-            await conn.execute(text(
-                "ALTER TABLE link_transactions ADD COLUMN IF NOT EXISTS callback_method VARCHAR(10)"
-            ))
-            
-            # Create bank_accounts table if it doesn't exist
-            await conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS bank_accounts (
-                    id SERIAL PRIMARY KEY,
-                    publisher_id INTEGER NOT NULL,
-                    account_holder_name VARCHAR(255) NOT NULL,
-                    bank_name VARCHAR(255) NOT NULL,
-                    account_number VARCHAR(100) NOT NULL,
-                    routing_number VARCHAR(50),
-                    swift_code VARCHAR(50),
-                    country VARCHAR(100) NOT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
-            
-            # Create withdrawal_requests table if it doesn't exist
-            await conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS withdrawal_requests (
-                    id SERIAL PRIMARY KEY,
-                    publisher_id INTEGER NOT NULL,
-                    bank_account_id INTEGER NOT NULL,
-                    amount FLOAT NOT NULL,
-                    status VARCHAR(20) DEFAULT 'pending',
-                    admin_note TEXT,
-                    requested_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    processed_at TIMESTAMP WITH TIME ZONE
-                )
-            """))
-            
-            # Create indexes for better query performance
-            await conn.execute(text(
-                "CREATE INDEX IF NOT EXISTS idx_bank_accounts_publisher_id ON bank_accounts(publisher_id)"
-            ))
-            await conn.execute(text(
-                "CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_publisher_id ON withdrawal_requests(publisher_id)"
-            ))
-            await conn.execute(text(
-                "CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_bank_account_id ON withdrawal_requests(bank_account_id)"
-            ))
-            
-            logger.info("Database migrations completed successfully")
-        except Exception as e:
-            logger.error(f"Error running migrations: {e}")
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK})
+        await conn.run_sync(_upgrade, config)
+    logger.info("Database migrations completed successfully")
 
 async def init_db():
-    """Initialize database tables"""
-    # Import models to ensure they are registered
-    from bot import models  # noqa: F401
-    
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("Database initialized successfully")
-    
+    """Bring the schema up to date and make sure the admin account exists"""
     await run_migrations()
     await create_default_admin()
 
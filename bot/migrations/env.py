@@ -0,0 +1,26 @@
+from asyncio import run
+from alembic import context
+from bot.database import Base, engine
+from bot import models  # noqa: F401
+
+target_metadata = Base.metadata
+
+def run_upgrade(connection):
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+async def run_online():
+    async with engine.connect() as connection:
+        await connection.run_sync(run_upgrade)
+    await engine.dispose()
+
+if context.is_offline_mode():
+    raise RuntimeError('Offline migrations are not supported, run against the database')
+
+# init_db passes the connection it holds the migration lock on; the alembic CLI does not
+connection = context.config.attributes.get('connection')
+if connection is not None:
+    run_upgrade(connection)
+else:
+    run(run_online())
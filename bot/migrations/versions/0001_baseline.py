@@ -0,0 +1,446 @@
+"""Baseline: the schema as run_migrations left it
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+Databases created before versioned migrations already hold some or all of this, so
+every step is idempotent; on them this revision only fills in what is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    _create_tables()
+    _upgrade_legacy_schema()
+    _create_indexes()
+
+def downgrade():
+    # Nothing below the baseline to go back to; the tables are left as they are
+    pass
+
+def _create_tables():
+    op.create_table('access_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.BigInteger(), nullable=False),
+    sa.Column('user_ip', sa.String(length=45), nullable=False),
+    sa.Column('user_agent', sa.Text(), nullable=True),
+    sa.Column('access_time', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('success', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('ad_networks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('network_name', sa.String(length=100), nullable=False),
+    sa.Column('banner_id', sa.String(length=255), nullable=True),
+    sa.Column('interstitial_id', sa.String(length=255), nullable=True),
+    sa.Column('rewarded_id', sa.String(length=255), nullable=True),
+    sa.Column('banner_daily_limit', sa.Integer(), nullable=False),
+    sa.Column('interstitial_daily_limit', sa.Integer(), nullable=False),
+    sa.Column('rewarded_daily_limit', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('ad_play_counts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ad_network_id', sa.Integer(), nullable=False),
+    sa.Column('ad_type', sa.String(length=20), nullable=False),
+    sa.Column('android_id', sa.String(length=255), nullable=True),
+    sa.Column('user_ip', sa.String(length=45), nullable=True),
+    sa.Column('play_date', sa.Date(), server_default=sa.text('CURRENT_DATE'), nullable=False),
+    sa.Column('play_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('admob_settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rewarded_ad_unit', sa.String(length=255), nullable=True),
+    sa.Column('rewarded_api_link', sa.Text(), nullable=True),
+    sa.Column('banner_ad_unit', sa.String(length=255), nullable=True),
+    sa.Column('banner_api_link', sa.Text(), nullable=True),
+    sa.Column('interstitial_ad_unit', sa.String(length=255), nullable=True),
+    sa.Column('interstitial_api_link', sa.Text(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('bank_accounts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('publisher_id', sa.Integer(), nullable=False),
+    sa.Column('account_holder_name', sa.String(length=255), nullable=False),
+    sa.Column('bank_name', sa.String(length=255), nullable=False),
+    sa.Column('account_number', sa.String(length=100), nullable=False),
+    sa.Column('routing_number', sa.String(length=50), nullable=True),
+    sa.Column('swift_code', sa.String(length=50), nullable=True),
+    sa.Column('country', sa.String(length=100), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('telegram_message_id', sa.BigInteger(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('file_size', sa.BigInteger(), nullable=False),
+    sa.Column('mime_type', sa.String(length=100), nullable=False),
+    sa.Column('access_code', sa.String(length=32), nullable=False),
+    sa.Column('video_duration', sa.Integer(), nullable=True),
+    sa.Column('temporary_stream_token', sa.String(length=64), nullable=True),
+    sa.Column('temporary_download_token', sa.String(length=64), nullable=True),
+    sa.Column('link_expiry_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('requested_by_android_id', sa.String(length=100), nullable=True),
+    sa.Column('publisher_id', sa.Integer(), nullable=True),
+    sa.Column('content_hash', sa.String(length=80), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('link_revocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('link_transactions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.BigInteger(), nullable=False),
+    sa.Column('android_id', sa.String(length=100), nullable=False),
+    sa.Column('hash_id', sa.String(length=32), nullable=False),
+    sa.Column('stream_link', sa.Text(), nullable=False),
+    sa.Column('download_link', sa.Text(), nullable=False),
+    sa.Column('callback_url', sa.Text(), nullable=True),
+    sa.Column('callback_method', sa.String(length=10), nullable=True),
+    sa.Column('callback_status', sa.Integer(), nullable=True),
+    sa.Column('callback_response', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('delivered', sa.Boolean(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('publisher_daily_stats',
+    sa.Column('publisher_id', sa.Integer(), nullable=False),
+    sa.Column('stat_date', sa.Date(), nullable=False),
+    sa.Column('files', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('impressions', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('earnings', sa.Float(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('publisher_id', 'stat_date'),
+    if_not_exists=True
+    )
+    op.create_table('publisher_impressions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('publisher_id', sa.Integer(), nullable=False),
+    sa.Column('hash_id', sa.String(length=32), nullable=False),
+    sa.Column('android_id', sa.String(length=255), nullable=False),
+    sa.Column('user_ip', sa.String(length=45), nullable=True),
+    sa.Column('impression_date', sa.Date(), server_default=sa.text('CURRENT_DATE'), nullable=False),
+    sa.Column('earning', sa.Float(), nullable=False),
+    sa.Column('settled', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('publishers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('traffic_source', sa.Text(), nullable=False),
+    sa.Column('api_key', sa.String(length=64), nullable=True),
+    sa.Column('telegram_id', sa.BigInteger(), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_login', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('terms_of_service', sa.Text(), nullable=True),
+    sa.Column('privacy_policy', sa.Text(), nullable=True),
+    sa.Column('impression_rate', sa.Float(), nullable=False),
+    sa.Column('android_package_name', sa.String(length=255), nullable=True),
+    sa.Column('android_deep_link_scheme', sa.String(length=100), nullable=True),
+    sa.Column('minimum_withdrawal', sa.Float(), nullable=False),
+    sa.Column('ads_api_token', sa.Text(), nullable=True),
+    sa.Column('callback_mode', sa.String(length=10), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=True),
+    sa.Column('first_name', sa.String(length=100), nullable=True),
+    sa.Column('last_name', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_seen', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('is_allowed', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('withdrawal_requests',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('publisher_id', sa.Integer(), nullable=False),
+    sa.Column('bank_account_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('admin_note', sa.Text(), nullable=True),
+    sa.Column('requested_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+
+def _upgrade_legacy_schema():
+    """Columns, indexes and data fixes the old startup migrations applied in place"""
+    # Add android_package_name column if it doesn't exist
+    op.execute(
+        "ALTER TABLE settings ADD COLUMN IF NOT EXISTS android_package_name VARCHAR(255)"
+    )
+    # Add android_deep_link_scheme column if it doesn't exist
+    op.execute(
+        "ALTER TABLE settings ADD COLUMN IF NOT EXISTS android_deep_link_scheme VARCHAR(100)"
+    )
+    # Add minimum_withdrawal column if it doesn't exist
+    op.execute(
+        "ALTER TABLE settings ADD COLUMN IF NOT EXISTS minimum_withdrawal FLOAT DEFAULT 10.0"
+    )
+    # Add balance column to publishers table if it doesn't exist
+    op.execute(
+        "ALTER TABLE publishers ADD COLUMN IF NOT EXISTS balance FLOAT DEFAULT 0.0"
+    )
+    # Add ads_api_token column to settings if it doesn't exist
+    op.execute(
+        "ALTER TABLE settings ADD COLUMN IF NOT EXISTS ads_api_token TEXT"
+    )
+    # Add callback_mode column to settings if it doesn't exist
+    op.execute(
+        "ALTER TABLE settings ADD COLUMN IF NOT EXISTS callback_mode VARCHAR(10) DEFAULT 'POST'"
+    )
+    # Add callback_method column to link_transactions if it doesn't exist
+    op.execute(
+        "ALTER TABLE link_transactions ADD COLUMN IF NOT EXISTS callback_method VARCHAR(10)"
+    )
+    # Callbacks are delivered from link_transactions as an outbox; rows recorded
+    # before it existed were already attempted inline, so they stay unscheduled
+    op.execute(
+        "ALTER TABLE link_transactions ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0"
+    )
+    op.execute(
+        "ALTER TABLE link_transactions ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE"
+    )
+    # Impressions carry their own earning and are credited to balances in batches;
+    # rows recorded before the ledger existed were already credited
+    op.execute(
+        "ALTER TABLE publisher_impressions ADD COLUMN IF NOT EXISTS earning FLOAT DEFAULT 0.0"
+    )
+    op.execute(
+        "ALTER TABLE publisher_impressions ADD COLUMN IF NOT EXISTS settled BOOLEAN DEFAULT TRUE"
+    )
+    # Duplicate uploads share the channel message of the first copy
+    op.execute(
+        "ALTER TABLE files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(80)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_files_content_hash ON files(content_hash)"
+    )
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE indexname = 'ix_files_telegram_message_id' AND indexdef LIKE 'CREATE UNIQUE%'
+            ) THEN
+                DROP INDEX ix_files_telegram_message_id;
+                CREATE INDEX ix_files_telegram_message_id ON files(telegram_message_id);
+            END IF;
+        END $$;
+    """)
+    
+    # Create indexes for better query performance
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bank_accounts_publisher_id ON bank_accounts(publisher_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_publisher_id ON withdrawal_requests(publisher_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_bank_account_id ON withdrawal_requests(bank_account_id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_publisher_impressions_unsettled ON publisher_impressions(id) WHERE settled = false"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_link_transactions_outbox ON link_transactions(next_attempt_at) WHERE next_attempt_at IS NOT NULL"
+    )
+    # List views page by (created_at, id) so deep pages stay index range scans
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_files_publisher_created ON files(publisher_id, created_at, id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_publishers_created ON publishers(created_at, id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_withdrawal_requests_requested ON withdrawal_requests(requested_at, id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_withdrawal_requests_status_requested ON withdrawal_requests(status, requested_at, id)"
+    )
+    # Hash id searches match substrings through a trigram index; pg_trgm ships with most
+    # PostgreSQL builds but needs a privileged role, and without it searches fall back to a scan
+    op.execute("""
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN insufficient_privilege OR feature_not_supported OR undefined_file THEN
+            RAISE WARNING 'pg_trgm is not available, hash id searches will scan files';
+        END $$;
+    """)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+               AND NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'ix_files_access_code_trgm') THEN
+                CREATE INDEX ix_files_access_code_trgm ON files USING gin (access_code gin_trgm_ops);
+            END IF;
+        END $$;
+    """)
+    # One play counter per network, ad type, day and device; concurrent increments
+    # used to create duplicates, so fold them into the oldest row before adding the key
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_ad_play_counts_device_day') THEN
+                UPDATE ad_play_counts keep
+                SET play_count = dup.total
+                FROM (
+                    SELECT MIN(id) AS id, SUM(play_count) AS total
+                    FROM ad_play_counts
+                    GROUP BY ad_network_id, ad_type, play_date, COALESCE(android_id, 'ip:' || user_ip)
+                    HAVING COUNT(*) > 1
+                ) dup
+                WHERE keep.id = dup.id;
+
+                DELETE FROM ad_play_counts a
+                USING ad_play_counts b
+                WHERE a.ad_network_id = b.ad_network_id
+                  AND a.ad_type = b.ad_type
+                  AND a.play_date = b.play_date
+                  AND COALESCE(a.android_id, 'ip:' || a.user_ip) = COALESCE(b.android_id, 'ip:' || b.user_ip)
+                  AND a.id > b.id;
+
+                CREATE UNIQUE INDEX uq_ad_play_counts_device_day ON ad_play_counts
+                    (ad_network_id, ad_type, play_date, COALESCE(android_id, 'ip:' || user_ip));
+            END IF;
+        END $$;
+    """)
+    # Publisher dashboards read daily rollups; files are counted by a trigger, impressions
+    # by the settler. The first run fills the rollups from the existing rows, with writes
+    # to files held off so none are counted twice or missed
+    op.execute("""
+        CREATE OR REPLACE FUNCTION count_publisher_daily_files() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' AND NEW.publisher_id IS NOT NULL THEN
+                INSERT INTO publisher_daily_stats (publisher_id, stat_date, files)
+                VALUES (NEW.publisher_id, NEW.created_at::date, 1)
+                ON CONFLICT (publisher_id, stat_date)
+                DO UPDATE SET files = publisher_daily_stats.files + 1;
+            ELSIF TG_OP = 'DELETE' AND OLD.publisher_id IS NOT NULL THEN
+                UPDATE publisher_daily_stats SET files = files - 1
+                WHERE publisher_id = OLD.publisher_id AND stat_date = OLD.created_at::date;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'files_publisher_daily_stats') THEN
+                LOCK TABLE files IN SHARE ROW EXCLUSIVE MODE;
+                DELETE FROM publisher_daily_stats;
+
+                INSERT INTO publisher_daily_stats (publisher_id, stat_date, files)
+                SELECT publisher_id, created_at::date, COUNT(*)
+                FROM files
+                WHERE publisher_id IS NOT NULL
+                GROUP BY publisher_id, created_at::date;
+
+                -- Unsettled impressions are added when the settler gets to them; impressions
+                -- recorded before earnings were stored are valued at the current rate
+                INSERT INTO publisher_daily_stats (publisher_id, stat_date, impressions, earnings)
+                SELECT publisher_id, impression_date, COUNT(*),
+                       SUM(CASE WHEN earning > 0 THEN earning
+                                ELSE COALESCE((SELECT impression_rate FROM settings ORDER BY id LIMIT 1), 0) END)
+                FROM publisher_impressions
+                WHERE settled = true
+                GROUP BY publisher_id, impression_date
+                ON CONFLICT (publisher_id, stat_date)
+                DO UPDATE SET impressions = EXCLUDED.impressions, earnings = EXCLUDED.earnings;
+
+                CREATE TRIGGER files_publisher_daily_stats
+                    AFTER INSERT OR DELETE ON files
+                    FOR EACH ROW EXECUTE FUNCTION count_publisher_daily_files();
+            END IF;
+        END $$;
+    """)
+
+def _create_indexes():
+    # After the legacy upgrade, which adds the columns some of these cover and
+    # removes the duplicates uq_ad_play_counts_device_day would reject
+    op.create_index(op.f('ix_access_logs_file_id'), 'access_logs', ['file_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_ad_networks_network_name'), 'ad_networks', ['network_name'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_ad_play_counts_ad_network_id'), 'ad_play_counts', ['ad_network_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_ad_play_counts_ad_type'), 'ad_play_counts', ['ad_type'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_ad_play_counts_android_id'), 'ad_play_counts', ['android_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_ad_play_counts_play_date'), 'ad_play_counts', ['play_date'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_ad_play_counts_user_ip'), 'ad_play_counts', ['user_ip'], unique=False, if_not_exists=True)
+    op.create_index('uq_ad_play_counts_device_day', 'ad_play_counts', ['ad_network_id', 'ad_type', 'play_date', sa.literal_column("coalesce(android_id, 'ip:' || user_ip)")], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_bank_accounts_publisher_id'), 'bank_accounts', ['publisher_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_files_access_code'), 'files', ['access_code'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_files_content_hash'), 'files', ['content_hash'], unique=False, if_not_exists=True)
+    op.create_index('ix_files_publisher_created', 'files', ['publisher_id', 'created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_files_publisher_id'), 'files', ['publisher_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_files_telegram_message_id'), 'files', ['telegram_message_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_files_temporary_download_token'), 'files', ['temporary_download_token'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_files_temporary_stream_token'), 'files', ['temporary_stream_token'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_link_revocations_expires_at'), 'link_revocations', ['expires_at'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_link_revocations_file_id'), 'link_revocations', ['file_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_link_transactions_android_id'), 'link_transactions', ['android_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_link_transactions_file_id'), 'link_transactions', ['file_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_link_transactions_hash_id'), 'link_transactions', ['hash_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_publisher_impressions_android_id'), 'publisher_impressions', ['android_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_publisher_impressions_hash_id'), 'publisher_impressions', ['hash_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_publisher_impressions_impression_date'), 'publisher_impressions', ['impression_date'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_publisher_impressions_publisher_id'), 'publisher_impressions', ['publisher_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_publishers_api_key'), 'publishers', ['api_key'], unique=True, if_not_exists=True)
+    op.create_index('ix_publishers_created', 'publishers', ['created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_publishers_email'), 'publishers', ['email'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_publishers_telegram_id'), 'publishers', ['telegram_id'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_users_telegram_id'), 'users', ['telegram_id'], unique=True, if_not_exists=True)
+    op.create_index(op.f('ix_withdrawal_requests_bank_account_id'), 'withdrawal_requests', ['bank_account_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_withdrawal_requests_publisher_id'), 'withdrawal_requests', ['publisher_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_withdrawal_requests_requested', 'withdrawal_requests', ['requested_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_withdrawal_requests_status_requested', 'withdrawal_requests', ['status', 'requested_at', 'id'], unique=False, if_not_exists=True)
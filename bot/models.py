@@ -1,4 +1,4 @@
-from sqlalchemy import String, BigInteger, DateTime, Text, Boolean, Integer, Date, Float
+from sqlalchemy import String, BigInteger, DateTime, Text, Boolean, Integer, Date, Float, Index, literal_column
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from bot.database import Base
@@ -10,7 +10,7 @@ class File(Base):
     __tablename__ = "files"
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    telegram_message_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
+    telegram_message_id: Mapped[int] = mapped_column(BigInteger, index=True)
     filename: Mapped[str] = mapped_column(String(255))
     file_size: Mapped[int] = mapped_column(BigInteger)
     mime_type: Mapped[str] = mapped_column(String(100))
@@ -21,10 +21,15 @@ class File(Base):
     link_expiry_time: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     requested_by_android_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     publisher_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+    # 'sha256:<hex>' for web uploads, 'tg:<document id>' for files sent to the bot
+    content_hash: Mapped[Optional[str]] = mapped_column(String(80), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
+# List views page through files newest first by (created_at, id)
+Index('ix_files_publisher_created', File.publisher_id, File.created_at, File.id)
+
 class User(Base):
     """Model for storing user information"""
     __tablename__ = "users"
@@ -65,6 +70,18 @@ class LinkTransaction(Base):
     callback_response: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     delivered: Mapped[bool] = mapped_column(Boolean, default=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    # Set while the callback is waiting for delivery or a retry
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class LinkRevocation(Base):
+    """Model for files whose signed links must no longer be accepted"""
+    __tablename__ = "link_revocations"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    file_id: Mapped[int] = mapped_column(Integer, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 class Publisher(Base):
     """Model for storing publisher information"""
@@ -82,6 +99,8 @@ class Publisher(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     last_login: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
+Index('ix_publishers_created', Publisher.created_at, Publisher.id)
+
 class AdMobSettings(Base):
     """Model for storing AdMob ads settings"""
     __tablename__ = "admob_settings"
@@ -127,6 +146,18 @@ class AdPlayCount(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+# Devices are counted by android_id, falling back to the IP address when there is none
+ad_play_device = func.coalesce(AdPlayCount.android_id, literal_column("'ip:'") + AdPlayCount.user_ip)
+
+Index(
+    'uq_ad_play_counts_device_day',
+    AdPlayCount.ad_network_id,
+    AdPlayCount.ad_type,
+    AdPlayCount.play_date,
+    ad_play_device,
+    unique=True
+)
+
 class PublisherImpression(Base):
     """Model for tracking publisher video impressions"""
     __tablename__ = "publisher_impressions"
@@ -137,8 +168,24 @@ class PublisherImpression(Base):
     android_id: Mapped[str] = mapped_column(String(255), index=True)
     user_ip: Mapped[Optional[str]] = mapped_column(String(45), nullable=True)
     impression_date: Mapped[date] = mapped_column(Date, index=True, server_default=func.current_date())
+    earning: Mapped[float] = mapped_column(Float, default=0.0)
+    settled: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+class PublisherDailyStats(Base):
+    """Per-publisher totals for one day, kept current so dashboards never scan files or impressions.
+
+    Files are counted by a trigger on the files table; impressions and their
+    earnings are added by the impression settler as it settles them.
+    """
+    __tablename__ = "publisher_daily_stats"
+    
+    publisher_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    stat_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    files: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    impressions: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    earnings: Mapped[float] = mapped_column(Float, default=0.0, server_default='0')
+
 class Settings(Base):
     """Model for storing application settings"""
     __tablename__ = "settings"
@@ -181,4 +228,7 @@ class WithdrawalRequest(Base):
     status: Mapped[str] = mapped_column(String(20), default='pending')
     admin_note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     requested_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+Index('ix_withdrawal_requests_requested', WithdrawalRequest.requested_at, WithdrawalRequest.id)
+Index('ix_withdrawal_requests_status_requested', WithdrawalRequest.status, WithdrawalRequest.requested_at, WithdrawalRequest.id)
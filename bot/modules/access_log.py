@@ -0,0 +1,112 @@
+from asyncio import Queue, QueueEmpty, QueueFull, Task, CancelledError, create_task, shield, wait_for
+from datetime import datetime, timezone
+from logging import getLogger
+from time import monotonic
+from bot.config import Server
+from bot.database import AsyncSessionLocal
+from bot.models import AccessLog
+from sqlalchemy import insert
+
+logger = getLogger('bot.access_log')
+
+class AccessLogWriter:
+    """Buffers AccessLog rows in a bounded queue and writes them in multi-row INSERT batches"""
+
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float):
+        self._queue: Queue[dict] = Queue(maxsize=queue_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._task: Task | None = None
+        self._flushing: Task | None = None
+        self._batch: list[dict] = []
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._reported_drops = 0
+
+    def log(self, file_id: int, user_ip: str, user_agent: str, success: bool):
+        """Queue an access attempt; never waits on the database"""
+        try:
+            self._queue.put_nowait({
+                'file_id': file_id,
+                'user_ip': user_ip,
+                'user_agent': user_agent or '',
+                'success': success,
+                'access_time': datetime.now(timezone.utc)
+            })
+        except QueueFull:
+            # Shedding log rows is preferable to stalling downloads behind the database
+            self.dropped += 1
+
+    async def _flush(self, rows: list[dict]):
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(AccessLog), rows)
+                await session.commit()
+            self.written += len(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f'Error writing {len(rows)} access log rows: {e}')
+
+    def _drain(self, rows: list[dict]):
+        while len(rows) < self._batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except QueueEmpty:
+                break
+
+    async def _run(self):
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = monotonic() + self._flush_interval
+
+            # Collect until the batch is full or the oldest row has waited flush_interval
+            while len(self._batch) < self._batch_size:
+                self._drain(self._batch)
+                remaining = deadline - monotonic()
+                if len(self._batch) >= self._batch_size or remaining <= 0:
+                    break
+                try:
+                    self._batch.append(await wait_for(self._queue.get(), remaining))
+                except TimeoutError:
+                    break
+
+            rows, self._batch = self._batch, []
+            # Shielded so stopping the writer never abandons a half-sent batch
+            self._flushing = create_task(self._flush(rows))
+            await shield(self._flushing)
+
+            if self.dropped > self._reported_drops:
+                logger.warning(f'Access log queue full, dropped {self.dropped - self._reported_drops} rows')
+                self._reported_drops = self.dropped
+
+    def start(self):
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    async def stop(self):
+        """Stop the background writer and flush everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+            self._task = None
+
+        if self._flushing is not None:
+            await self._flushing
+
+        rows, self._batch = self._batch, []
+        while rows or not self._queue.empty():
+            self._drain(rows)
+            await self._flush(rows)
+            rows = []
+
+        logger.info(f'Access log writer stopped: {self.written} written, {self.dropped} dropped, {self.failed} failed')
+
+access_log_writer = AccessLogWriter(
+    queue_size=Server.ACCESS_LOG_QUEUE_SIZE,
+    batch_size=Server.ACCESS_LOG_BATCH_SIZE,
+    flush_interval=Server.ACCESS_LOG_FLUSH_INTERVAL
+)
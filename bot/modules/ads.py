@@ -0,0 +1,290 @@
+from asyncio import Task, CancelledError, create_task, current_task, shield, sleep
+from datetime import date
+from logging import getLogger
+from bot.config import Server
+from bot.database import AsyncSessionLocal
+from bot.models import AdNetwork, AdPlayCount, ad_play_device
+from bot.modules.notify import subscribe
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+logger = getLogger('bot.ads')
+
+AD_TYPES = ('banner', 'interstitial', 'rewarded')
+
+# (play_date, ad_network_id, ad_type, device) where device is the android_id, or 'ip:<address>' without one
+CounterKey = tuple[date, int, str, str]
+
+class AdEngine:
+    """Serves the ad waterfall from memory and persists daily play counts in the background"""
+
+    WRITE_BATCH_SIZE = 1000
+
+    def __init__(self, flush_interval: float):
+        self._flush_interval = flush_interval
+        # ad_type -> [(network, daily_limit)] in priority order
+        self._waterfalls: dict[str, list[tuple[AdNetwork, int]]] | None = None
+        self._loading: Task | None = None
+        self._counts: dict[CounterKey, int] = {}
+        # Increments not yet written, with the android_id/user_ip to store them under
+        self._pending: dict[CounterKey, list] = {}
+        self._task: Task | None = None
+        self._flushing: Task | None = None
+
+    @staticmethod
+    def _device(android_id: str | None, user_ip: str | None) -> str:
+        return android_id if android_id else f'ip:{user_ip}'
+
+    async def _load_waterfalls(self):
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(AdNetwork)
+                .where(AdNetwork.status == 'active')
+                .order_by(AdNetwork.priority)
+            )
+            networks = result.scalars().all()
+
+        waterfalls = {ad_type: [] for ad_type in AD_TYPES}
+        for network in networks:
+            for ad_type in AD_TYPES:
+                if getattr(network, f'{ad_type}_id'):
+                    waterfalls[ad_type].append((network, getattr(network, f'{ad_type}_daily_limit') or 0))
+
+        # An admin edit that arrived while loading makes this result stale
+        if self._loading is current_task():
+            self._waterfalls = waterfalls
+
+        return waterfalls
+
+    async def _waterfall(self, ad_type: str) -> list[tuple[AdNetwork, int]]:
+        if self._waterfalls is None:
+            if self._loading is None or self._loading.done():
+                self._loading = create_task(self._load_waterfalls())
+            return (await shield(self._loading))[ad_type]
+
+        return self._waterfalls[ad_type]
+
+    def invalidate(self, _payload: str | None = None):
+        """Forget the waterfall so the next request reloads the ad networks"""
+        self._waterfalls = None
+        self._loading = None
+
+    async def load_counts(self):
+        """Seed today's play counts from the database"""
+        today = date.today()
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    AdPlayCount.ad_network_id,
+                    AdPlayCount.ad_type,
+                    AdPlayCount.android_id,
+                    AdPlayCount.user_ip,
+                    AdPlayCount.play_count
+                ).where(AdPlayCount.play_date == today)
+            )
+            for network_id, ad_type, android_id, user_ip, play_count in result:
+                key = (today, network_id, ad_type, self._device(android_id, user_ip))
+                self._counts[key] = self._counts.get(key, 0) + (play_count or 0)
+
+        logger.info(f'Loaded {len(self._counts)} ad play counters for {today}')
+
+    async def _seed(self, today: date, ad_type: str, device: str, waterfall: list[tuple[AdNetwork, int]]):
+        """Start counters this process has not seen yet from the stored totals.
+
+        Without this every web worker, and every process restarted mid-day, would
+        allow a device a full daily limit of its own.
+        """
+        missing = [
+            network.id for network, daily_limit in waterfall
+            if daily_limit and (today, network.id, ad_type, device) not in self._counts
+        ]
+        if not missing:
+            return
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(AdPlayCount.ad_network_id, func.sum(AdPlayCount.play_count))
+                    .where(
+                        AdPlayCount.play_date == today,
+                        AdPlayCount.ad_type == ad_type,
+                        AdPlayCount.ad_network_id.in_(missing),
+                        ad_play_device == device
+                    )
+                    .group_by(AdPlayCount.ad_network_id)
+                )
+                stored = dict(result.all())
+        except Exception as e:
+            logger.error(f'Error loading ad play counts for {device}: {e}')
+            return
+
+        for network_id in missing:
+            # Another request for the device may have seeded and counted it while the query ran
+            self._counts.setdefault((today, network_id, ad_type, device), stored.get(network_id) or 0)
+
+    async def serve(self, ad_type: str, android_id: str | None, user_ip: str | None) -> AdNetwork | None:
+        """Pick the first network in priority order that is under its daily limit and count the play"""
+        today = date.today()
+        device = self._device(android_id, user_ip)
+        waterfall = await self._waterfall(ad_type)
+        await self._seed(today, ad_type, device, waterfall)
+        workers = max(Server.WEB_WORKERS, 1)
+
+        for network, daily_limit in waterfall:
+            key = (today, network.id, ad_type, device)
+            count = self._counts.get(key, 0)
+
+            # A limit of 0 means unlimited
+            if daily_limit and count >= daily_limit:
+                continue
+
+            pending = self._pending.setdefault(key, [0, android_id or None, user_ip])
+            stored = count - pending[0]
+            # Each worker counts at most its share of the plays left in memory; past that the database decides
+            if daily_limit and stored + workers * (pending[0] + 1) > daily_limit - Server.AD_LIMIT_MARGIN:
+                if await self._claim(key, daily_limit, android_id, user_ip):
+                    return network
+                continue
+
+            self._counts[key] = count + 1
+            pending[0] += 1
+            return network
+
+        return None
+
+    async def _claim(self, key: CounterKey, daily_limit: int, android_id: str | None, user_ip: str | None) -> bool:
+        """Count one play only if the stored total is still under the limit, checked and incremented in one upsert"""
+        play_date, network_id, ad_type, _ = key
+        # Plays this process already served are stored first, whatever the outcome
+        pending = self._pending.pop(key, None)
+
+        claim = insert(AdPlayCount).values(
+            ad_network_id=network_id,
+            ad_type=ad_type,
+            android_id=android_id or None,
+            user_ip=user_ip,
+            play_date=play_date,
+            play_count=1
+        )
+        claim = claim.on_conflict_do_update(
+            index_elements=[AdPlayCount.ad_network_id, AdPlayCount.ad_type, AdPlayCount.play_date, ad_play_device],
+            set_={'play_count': AdPlayCount.play_count + 1, 'updated_at': func.now()},
+            where=AdPlayCount.play_count < daily_limit
+        ).returning(AdPlayCount.play_count)
+
+        try:
+            async with AsyncSessionLocal() as session:
+                if pending and pending[0]:
+                    await session.execute(self._increments([(key, *pending)]))
+                result = await session.execute(claim)
+                total = result.scalar_one_or_none()
+                await session.commit()
+        except Exception as e:
+            logger.error(f'Error counting ad play against the database, counting it locally: {e}')
+            retry = self._pending.setdefault(key, [0, android_id or None, user_ip])
+            retry[0] += (pending[0] if pending else 0) + 1
+            self._counts[key] = self._counts.get(key, 0) + 1
+            return True
+
+        if total is None:
+            # The limit was reached, by this process or another; no need to ask again today
+            self._counts[key] = max(self._counts.get(key, 0), daily_limit)
+            return False
+
+        self._counts[key] = total + self._pending.get(key, [0])[0]
+        return True
+
+    def _increments(self, batch: list[tuple[CounterKey, int, str | None, str | None]]):
+        """One upsert adding every increment in the batch, returning the stored totals"""
+        statement = insert(AdPlayCount).values([
+            {
+                'ad_network_id': network_id,
+                'ad_type': ad_type,
+                'android_id': android_id,
+                'user_ip': user_ip,
+                'play_date': play_date,
+                'play_count': delta
+            }
+            for (play_date, network_id, ad_type, _), delta, android_id, user_ip in batch
+        ])
+        return statement.on_conflict_do_update(
+            index_elements=[AdPlayCount.ad_network_id, AdPlayCount.ad_type, AdPlayCount.play_date, ad_play_device],
+            set_={
+                'play_count': AdPlayCount.play_count + statement.excluded.play_count,
+                'updated_at': func.now()
+            }
+        ).returning(
+            AdPlayCount.ad_network_id,
+            AdPlayCount.ad_type,
+            AdPlayCount.play_date,
+            ad_play_device,
+            AdPlayCount.play_count
+        )
+
+    async def _write(self, batch: list[tuple[CounterKey, int, str | None, str | None]]) -> list[int | None]:
+        """Add the increments in one upsert; returns the stored totals in batch order"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(self._increments(batch))
+            totals = {
+                (play_date, network_id, ad_type, device): play_count
+                for network_id, ad_type, play_date, device, play_count in result
+            }
+            await session.commit()
+
+        return [totals.get(key) for key, *_ in batch]
+
+    async def flush(self):
+        """Write pending play count increments and forget counters of previous days"""
+        pending, self._pending = self._pending, {}
+        batch = [(key, delta, android_id, user_ip) for key, (delta, android_id, user_ip) in pending.items()]
+
+        for offset in range(0, len(batch), self.WRITE_BATCH_SIZE):
+            chunk = batch[offset:offset + self.WRITE_BATCH_SIZE]
+            try:
+                totals = await self._write(chunk)
+            except Exception as e:
+                logger.error(f'Error saving {len(chunk)} ad play counts: {e}')
+                # Keep the increments for the next flush
+                for key, delta, android_id, user_ip in chunk:
+                    retry = self._pending.setdefault(key, [0, android_id, user_ip])
+                    retry[0] += delta
+                continue
+
+            # The stored total includes plays served by other workers; add back
+            # whatever this process served since the batch was taken
+            for (key, *_), total in zip(chunk, totals):
+                if total is not None:
+                    self._counts[key] = total + self._pending.get(key, [0])[0]
+
+        today = date.today()
+        for key in [key for key in self._counts if key[0] != today]:
+            del self._counts[key]
+
+    async def _run(self):
+        while True:
+            await sleep(self._flush_interval)
+            # Shielded so stopping the engine never drops increments taken out of _pending
+            self._flushing = create_task(self.flush())
+            await shield(self._flushing)
+
+    def start(self):
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+            self._task = None
+
+        if self._flushing is not None:
+            await self._flushing
+
+        await self.flush()
+
+ad_engine = AdEngine(flush_interval=Server.AD_COUNTER_FLUSH_INTERVAL)
+subscribe('ad_networks', ad_engine.invalidate)
@@ -0,0 +1,23 @@
+from secrets import token_urlsafe
+from bot.config import Server
+
+def local_id(nbytes: int) -> str:
+    """Random id for state held in this process; in a web worker it is prefixed with the worker index"""
+    token = token_urlsafe(nbytes)
+    if Server.WORKER_INDEX is None:
+        return token
+    return f'{Server.WORKER_INDEX}.{token}'
+
+def owning_worker(resource_id: str) -> int | None:
+    """Index of the sibling worker holding the state behind an id, or None if it is this process"""
+    if Server.WORKER_INDEX is None:
+        return None
+
+    prefix, dot, _ = resource_id.partition('.')
+    if not dot or not prefix.isdigit():
+        return None
+
+    index = int(prefix)
+    if index == Server.WORKER_INDEX or index >= Server.WEB_WORKERS:
+        return None
+    return index
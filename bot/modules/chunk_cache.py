@@ -0,0 +1,157 @@
+from asyncio import Task, create_task, to_thread
+from collections import OrderedDict
+from logging import getLogger
+from pathlib import Path
+from shutil import rmtree
+from bot.config import Server
+from bot.modules.notify import subscribe
+import mmap
+import os
+
+logger = getLogger('bot.cache')
+
+class ChunkCache:
+    """Size-capped LRU cache of Telegram file chunks keyed by (telegram_message_id, chunk_index)"""
+
+    def __init__(self, directory: str, max_size: int, max_pending_writes: int = 16):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.max_pending_writes = max_pending_writes
+        self._entries: OrderedDict[tuple[int, int], int] = OrderedDict()
+        self._size = 0
+        self._writes: set[Task] = set()
+        # Chunks with a write in flight; concurrent misses must not share its temp file
+        self._storing: set[tuple[int, int]] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _path(self, message_id: int, index: int) -> Path:
+        return self.directory / str(message_id) / f'{index}.chunk'
+
+    def _scan(self) -> list[tuple[float, tuple[int, int], int]]:
+        found = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for path in self.directory.glob('*/*'):
+            # Leftovers of writes interrupted by a crash are never renamed into place
+            if path.suffix != '.chunk':
+                path.unlink(missing_ok=True)
+                continue
+
+            try:
+                stat = path.stat()
+                key = (int(path.parent.name), int(path.stem))
+            except (OSError, ValueError):
+                continue
+
+            if stat.st_size:
+                found.append((stat.st_mtime, key, stat.st_size))
+
+        return sorted(found)
+
+    async def load(self):
+        """Rebuild the in-memory index from the cache directory"""
+        if not self.enabled:
+            return
+
+        for _, key, size in await to_thread(self._scan):
+            self._entries[key] = size
+            self._size += size
+
+        logger.info(f'Chunk cache loaded: {len(self._entries)} chunks, {self._size // (1024 * 1024)} MiB')
+        await self._evict()
+
+    def get(self, message_id: int, index: int) -> memoryview | None:
+        """Return a memory-mapped view of a cached chunk, or None on a miss"""
+        key = (message_id, index)
+        if key not in self._entries:
+            return None
+
+        try:
+            with open(self._path(message_id, index), 'rb') as fp:
+                mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return memoryview(mapped)
+
+    def store(self, message_id: int, index: int, data: bytes):
+        """Schedule a chunk to be written to disk without blocking the caller"""
+        key = (message_id, index)
+        if not self.enabled or not data or key in self._entries or key in self._storing:
+            return
+
+        # Bound the memory held by queued writes; a skipped chunk is simply fetched again later
+        if len(self._writes) >= self.max_pending_writes:
+            return
+
+        self._storing.add(key)
+        task = create_task(self._put(message_id, index, data))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+
+        with open(temp_path, 'wb') as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        os.replace(temp_path, path)
+
+    async def _put(self, message_id: int, index: int, data: bytes):
+        key = (message_id, index)
+
+        try:
+            await to_thread(self._write, self._path(message_id, index), data)
+        except OSError as e:
+            logger.warning(f'Could not cache chunk {index} of message {message_id}: {e}')
+            return
+        finally:
+            self._storing.discard(key)
+
+        if key not in self._entries:
+            self._entries[key] = len(data)
+            self._size += len(data)
+
+        await self._evict()
+
+    async def _evict(self):
+        victims = []
+        while self._size > self.max_size and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            victims.append(key)
+
+        for message_id, index in victims:
+            await to_thread(self._path(message_id, index).unlink, True)
+
+    def _forget(self, key: tuple[int, int]):
+        size = self._entries.pop(key, None)
+        if size:
+            self._size -= size
+
+    async def discard(self, message_id: int):
+        """Drop every cached chunk of a message"""
+        for key in [key for key in self._entries if key[0] == message_id]:
+            self._forget(key)
+
+        await to_thread(rmtree, self.directory / str(message_id), True)
+
+if Server.WORKER_INDEX is None:
+    chunk_cache = ChunkCache(Server.CACHE_DIR, Server.CACHE_MAX_SIZE)
+else:
+    # Each web worker indexes and evicts only its own chunks, so they get a directory and a share of the budget each
+    chunk_cache = ChunkCache(f'{Server.CACHE_DIR}.{Server.WORKER_INDEX}', Server.CACHE_MAX_SIZE // Server.WEB_WORKERS)
+
+async def _on_message_deleted(payload: str | None):
+    if payload is not None:
+        await chunk_cache.discard(int(payload))
+
+subscribe('message_deleted', _on_message_deleted)
@@ -0,0 +1,72 @@
+from logging import getLogger
+from time import monotonic
+from telethon import TelegramClient
+from bot import TelegramBot
+from bot.config import Telegram, Server
+
+logger = getLogger('bot.clients')
+
+class DownloadClient:
+    """A Telegram session downloads are spread over, with the load it is currently carrying"""
+
+    def __init__(self, client: TelegramClient, name: str):
+        self.client = client
+        self.name = name
+        self.in_flight = 0
+        self.flood_until = 0.0
+
+    @property
+    def flooded(self) -> bool:
+        return self.flood_until > monotonic()
+
+class ClientPool:
+    """The bot client plus one download-only session per extra bot token, each a member of CHANNEL_ID"""
+
+    def __init__(self, tokens: list[str]):
+        self._tokens = tokens
+        self.members = [DownloadClient(TelegramBot, 'bot')]
+
+    async def start(self):
+        """Sign in the extra sessions; one that fails or cannot see the channel is left out"""
+        prefix = 'download' if Server.WORKER_INDEX is None else f'web-{Server.WORKER_INDEX}-download'
+        for index, token in enumerate(self._tokens):
+            member = DownloadClient(TelegramClient(
+                session=f'{prefix}-{index}',
+                api_id=Telegram.API_ID,
+                api_hash=Telegram.API_HASH,
+                receive_updates=False,
+                # Surface flood waits so the chunk moves to another client instead of sleeping here
+                flood_sleep_threshold=0
+            ), f'download-{index}')
+
+            try:
+                await member.client.start(bot_token=token)
+                await member.client.get_input_entity(Telegram.CHANNEL_ID)
+            except Exception as e:
+                logger.error(f'Download client {member.name} is unavailable: {e}')
+                await member.client.disconnect()
+                continue
+
+            self.members.append(member)
+
+        if len(self.members) > 1:
+            logger.info(f'Downloads are spread over {len(self.members)} Telegram clients')
+
+    async def stop(self):
+        for member in self.members[1:]:
+            await member.client.disconnect()
+        self.members = self.members[:1]
+
+    def pick(self, exclude: set[DownloadClient]) -> DownloadClient | None:
+        """The least loaded client not in `exclude`, preferring those not waiting out a flood"""
+        candidates = [member for member in self.members if member not in exclude]
+        if not candidates:
+            return None
+
+        return min(candidates, key=lambda member: (member.flooded, member.flood_until if member.flooded else member.in_flight))
+
+    def flood_wait(self, member: DownloadClient, seconds: int):
+        member.flood_until = monotonic() + seconds
+        logger.warning(f'Download client {member.name} must wait {seconds}s, failing over')
+
+client_pool = ClientPool(Server.DOWNLOAD_BOT_TOKENS)
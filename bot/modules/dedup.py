@@ -0,0 +1,70 @@
+from logging import getLogger
+from secrets import token_hex
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.config import Telegram
+from bot.database import AsyncSessionLocal
+from bot.models import File
+from bot.modules.telegram import get_message
+
+logger = getLogger('bot.dedup')
+
+async def lock_message(session: AsyncSession, message_id: int):
+    """Serialize work on one channel message until the transaction ends.
+
+    Taken when a duplicate is attached to a message and when the revoke
+    button decides whether the message is still in use.
+    """
+    await session.execute(select(func.pg_advisory_xact_lock(message_id)))
+
+async def message_in_use(session: AsyncSession, message_id: int) -> bool:
+    result = await session.execute(
+        select(File.id).where(File.telegram_message_id == message_id).limit(1)
+    )
+    return result.first() is not None
+
+async def reuse_upload(content_hash: str, publisher_id: int | None = None, filename: str | None = None) -> File | None:
+    """Record a new File on the channel message of an earlier upload with the same content, if there is one"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(File)
+            .where(File.content_hash == content_hash)
+            .order_by(File.id)
+            .limit(1)
+        )
+        original = result.scalar_one_or_none()
+
+    if original is None:
+        return None
+
+    message_id = original.telegram_message_id
+    if not await get_message(message_id):
+        return None
+
+    async with AsyncSessionLocal() as session:
+        try:
+            await lock_message(session, message_id)
+            # The revoke button may have removed the last record while we waited
+            if not await message_in_use(session, message_id):
+                await session.rollback()
+                return None
+
+            file_record = File(
+                telegram_message_id=message_id,
+                filename=filename or original.filename,
+                file_size=original.file_size,
+                mime_type=original.mime_type,
+                access_code=token_hex(Telegram.SECRET_CODE_LENGTH),
+                video_duration=original.video_duration,
+                publisher_id=publisher_id,
+                content_hash=content_hash
+            )
+            session.add(file_record)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Error recording duplicate upload: {e}")
+            return None
+
+    logger.info(f"Duplicate upload {file_record.access_code} reuses message {message_id}")
+    return file_record
@@ -0,0 +1,21 @@
+from bot.config import Server
+import httpx
+
+_client: httpx.AsyncClient | None = None
+
+def http_client() -> httpx.AsyncClient:
+    """Process-wide HTTP client, so outgoing requests reuse pooled HTTP/2 and keep-alive connections"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=Server.CALLBACK_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,157 @@
+from asyncio import Event, Semaphore, Task, CancelledError, create_task, shield
+from collections import OrderedDict, deque
+from logging import getLogger
+from time import monotonic
+from typing import Any, Awaitable, Callable
+from bot.config import Server
+from bot.modules.affinity import local_id
+from bot.modules.uploader import UploadError
+
+logger = getLogger('bot.jobs')
+
+class UploadJob:
+    """Progress of one queued upload, observable by polling or by waiting for changes"""
+
+    def __init__(self, publisher_id: int | None):
+        self.id = local_id(16)
+        self.publisher_id = publisher_id
+        self.state = 'queued'
+        self.result: Any = None
+        self.error: str | None = None
+        self.finished_at: float | None = None
+        self.changed = Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('done', 'failed')
+
+    def _update(self, state: str, result: Any = None, error: str | None = None):
+        self.state = state
+        self.result = result
+        self.error = error
+        if self.finished:
+            self.finished_at = monotonic()
+
+        # Wake everyone waiting on the old event and hand out a fresh one
+        changed, self.changed = self.changed, Event()
+        changed.set()
+
+class UploadQueue:
+    """Runs upload jobs `concurrency` at a time, taking one job from each publisher in turn"""
+
+    def __init__(self, concurrency: int, retention: float):
+        self._concurrency = max(concurrency, 1)
+        self._retention = retention
+        # publisher_id -> jobs in submission order; publishers are served round robin
+        self._queues: OrderedDict[int | None, deque[tuple[UploadJob, Callable[[], Awaitable[Any]]]]] = OrderedDict()
+        self._jobs: dict[str, UploadJob] = {}
+        self._pending = Semaphore(0)
+        self._workers: list[Task] = []
+        self._running: set[Task] = set()
+
+    def _sweep(self):
+        now = monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self._retention:
+                del self._jobs[job_id]
+
+    def submit(self, publisher_id: int | None, work: Callable[[], Awaitable[Any]]) -> UploadJob:
+        """Queue `work`; its return value becomes the job result"""
+        self._sweep()
+        job = UploadJob(publisher_id)
+        self._jobs[job.id] = job
+        self._queues.setdefault(publisher_id, deque()).append((job, work))
+        self._pending.release()
+        return job
+
+    def get(self, job_id: str, publisher_id: int | None) -> UploadJob | None:
+        job = self._jobs.get(job_id)
+        if job is None or job.publisher_id != publisher_id:
+            return None
+        return job
+
+    def position(self, job: UploadJob) -> int | None:
+        """Number of jobs that will start before this one"""
+        queue = self._queues.get(job.publisher_id)
+        if queue is None:
+            return None
+
+        index = next((i for i, (queued, _) in enumerate(queue) if queued is job), None)
+        if index is None:
+            return None
+
+        # Publishers ahead in the rotation get index + 1 turns first, those behind get index
+        ahead = index
+        before = True
+        for owner, other in self._queues.items():
+            if owner == job.publisher_id:
+                before = False
+            else:
+                ahead += min(len(other), index + 1 if before else index)
+
+        return ahead
+
+    def status(self, job: UploadJob) -> dict:
+        status = {'job_id': job.id, 'state': job.state}
+        if job.state == 'queued':
+            status['position'] = self.position(job)
+        if job.state == 'done':
+            status['result'] = job.result
+        if job.state == 'failed':
+            status['message'] = job.error
+        return status
+
+    def _next(self) -> tuple[UploadJob, Callable[[], Awaitable[Any]]]:
+        owner, queue = next(iter(self._queues.items()))
+        item = queue.popleft()
+        del self._queues[owner]
+        if queue:
+            # Back of the line until every other publisher had a turn
+            self._queues[owner] = queue
+        return item
+
+    async def _run(self, job: UploadJob, work: Callable[[], Awaitable[Any]]):
+        job._update('running')
+        try:
+            job._update('done', result=await work())
+        except UploadError as e:
+            job._update('failed', error=str(e))
+        except Exception as e:
+            logger.error(f'Upload job {job.id} failed: {e}')
+            job._update('failed', error='Internal server error')
+
+    async def _work(self):
+        while True:
+            await self._pending.acquire()
+            task = create_task(self._run(*self._next()))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            # Shielded so shutting down lets a started upload finish
+            await shield(task)
+
+    def start(self):
+        if not self._workers:
+            self._workers = [create_task(self._work()) for _ in range(self._concurrency)]
+
+    async def stop(self):
+        """Stop taking jobs, let running ones finish and fail the rest"""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except CancelledError:
+                pass
+        self._workers = []
+
+        for task in list(self._running):
+            await task
+
+        while self._queues:
+            job, _ = self._next()
+            job._update('failed', error='Server is shutting down')
+
+upload_queue = UploadQueue(
+    concurrency=Server.UPLOAD_JOB_CONCURRENCY,
+    retention=Server.UPLOAD_JOB_RETENTION
+)
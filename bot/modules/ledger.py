@@ -0,0 +1,105 @@
+from asyncio import Task, CancelledError, create_task, sleep
+from collections import defaultdict
+from logging import getLogger
+from bot.config import Server
+from bot.database import AsyncSessionLocal
+from bot.models import Publisher, PublisherDailyStats, PublisherImpression
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+
+logger = getLogger('bot.ledger')
+
+class ImpressionSettler:
+    """Credits unsettled impression earnings to publisher balances in periodic batches"""
+
+    def __init__(self, interval: float, batch_size: int):
+        self._interval = interval
+        self._batch_size = batch_size
+        self._task: Task | None = None
+
+    async def settle_batch(self) -> int:
+        """Settle up to batch_size impressions; returns how many were settled"""
+        async with AsyncSessionLocal() as session:
+            try:
+                # Marking rows settled, crediting balances and adding to the daily rollups share
+                # one transaction, so every impression is counted exactly once, even across restarts
+                batch = (
+                    select(PublisherImpression.id)
+                    .where(PublisherImpression.settled == False)
+                    .order_by(PublisherImpression.id)
+                    .limit(self._batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                result = await session.execute(
+                    update(PublisherImpression)
+                    .where(PublisherImpression.id.in_(batch.scalar_subquery()))
+                    .values(settled=True)
+                    .returning(PublisherImpression.publisher_id, PublisherImpression.impression_date, PublisherImpression.earning)
+                )
+                rows = result.all()
+
+                earnings = defaultdict(float)
+                # (publisher_id, impression_date) -> [impressions, earnings] for the dashboard rollups
+                daily = defaultdict(lambda: [0, 0.0])
+                for publisher_id, impression_date, earning in rows:
+                    earnings[publisher_id] += earning or 0.0
+                    daily[publisher_id, impression_date][0] += 1
+                    daily[publisher_id, impression_date][1] += earning or 0.0
+
+                # Concurrent settlers credit overlapping publishers; locking them in id order keeps them from deadlocking
+                for publisher_id, delta in sorted(earnings.items()):
+                    await session.execute(
+                        update(Publisher)
+                        .where(Publisher.id == publisher_id)
+                        .values(balance=Publisher.balance + delta)
+                    )
+
+                if daily:
+                    stmt = insert(PublisherDailyStats).values([
+                        {'publisher_id': publisher_id, 'stat_date': stat_date, 'files': 0, 'impressions': impressions, 'earnings': total}
+                        for (publisher_id, stat_date), (impressions, total) in sorted(daily.items())
+                    ])
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=[PublisherDailyStats.publisher_id, PublisherDailyStats.stat_date],
+                        set_={
+                            'impressions': PublisherDailyStats.impressions + stmt.excluded.impressions,
+                            'earnings': PublisherDailyStats.earnings + stmt.excluded.earnings
+                        }
+                    ))
+
+                await session.commit()
+                return len(rows)
+            except Exception as e:
+                await session.rollback()
+                logger.error(f'Error settling impressions: {e}')
+                return 0
+
+    async def settle(self):
+        """Settle everything that is currently pending"""
+        while await self.settle_batch() >= self._batch_size:
+            pass
+
+    async def _run(self):
+        while True:
+            await sleep(self._interval)
+            await self.settle()
+
+    def start(self):
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+            self._task = None
+
+        await self.settle()
+
+impression_settler = ImpressionSettler(
+    interval=Server.SETTLEMENT_INTERVAL,
+    batch_size=Server.SETTLEMENT_BATCH_SIZE
+)
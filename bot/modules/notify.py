@@ -0,0 +1,104 @@
+from asyncio import Event, Task, CancelledError, create_task, sleep
+from collections import defaultdict
+from inspect import isawaitable
+from logging import getLogger
+from typing import Awaitable, Callable
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.database import clean_url
+import asyncpg
+
+logger = getLogger('bot.notify')
+
+CHANNEL = 'bot_events'
+
+_handlers: dict[str, list[Callable[[str | None], Awaitable[None] | None]]] = defaultdict(list)
+# Coroutines started by async handlers
+_running: set[Task] = set()
+
+def subscribe(event: str, handler: Callable[[str | None], Awaitable[None] | None]):
+    """Call `handler(payload)` whenever any process publishes `event`.
+
+    The payload is None after the listener reconnects, meaning notifications
+    may have been missed and the handler should assume anything changed.
+    Async handlers are run as tasks so they never hold up the listener.
+    """
+    _handlers[event].append(handler)
+
+async def publish(session: AsyncSession, event: str, payload: str = ''):
+    """Queue a notification; Postgres delivers it to every listener when the session commits"""
+    await session.execute(
+        text("SELECT pg_notify(:channel, :message)"),
+        {'channel': CHANNEL, 'message': f'{event}:{payload}'}
+    )
+
+async def _await_handler(event: str, result: Awaitable[None]):
+    try:
+        await result
+    except Exception as e:
+        logger.error(f'Error handling {event} notification: {e}')
+
+def _dispatch(event: str, payload: str | None):
+    for handler in _handlers.get(event, ()):
+        try:
+            result = handler(payload)
+        except Exception as e:
+            logger.error(f'Error handling {event} notification: {e}')
+            continue
+
+        if isawaitable(result):
+            task = create_task(_await_handler(event, result))
+            _running.add(task)
+            task.add_done_callback(_running.discard)
+
+class Listener:
+    """Keeps a dedicated LISTEN connection open and dispatches notifications to subscribers"""
+
+    def __init__(self, dsn: str, retry_interval: float = 5):
+        self._dsn = dsn
+        self._retry_interval = retry_interval
+        self._task: Task | None = None
+
+    def _on_notification(self, connection, pid, channel, message: str):
+        event, _, payload = message.partition(':')
+        _dispatch(event, payload)
+
+    async def _run(self):
+        while True:
+            connection = None
+            try:
+                closed = Event()
+                connection = await asyncpg.connect(self._dsn)
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notification)
+
+                # Anything published while we were not listening is lost
+                for event in list(_handlers):
+                    _dispatch(event, None)
+
+                await closed.wait()
+                logger.warning('Notification listener connection lost, reconnecting')
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f'Notification listener error: {e}')
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await sleep(self._retry_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+            self._task = None
+
+listener = Listener(clean_url)
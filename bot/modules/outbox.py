@@ -0,0 +1,149 @@
+from asyncio import Event, Task, CancelledError, create_task, gather, wait_for
+from datetime import timedelta
+from logging import getLogger
+from bot.config import Server
+from bot.database import AsyncSessionLocal
+from bot.models import LinkTransaction
+from bot.modules.http import http_client
+from sqlalchemy import select, update, func
+
+logger = getLogger('bot.outbox')
+
+async def send_links_to_api(android_id: str, stream_link: str, download_link: str, callback_url: str, callback_method: str = 'POST') -> tuple[bool, int, str]:
+    """Send generated links to external API using GET or POST method"""
+    payload = {
+        'android_id': android_id,
+        'stream_link': stream_link,
+        'download_link': download_link
+    }
+    try:
+        if callback_method.upper() == 'GET':
+            response = await http_client().get(callback_url, params=payload)
+        else:
+            response = await http_client().post(callback_url, json=payload)
+
+        success = 200 <= response.status_code < 300
+        if not success:
+            logger.warning(f"API callback ({callback_method}) failed with status {response.status_code}: {response.text}")
+        return success, response.status_code, response.text
+    except Exception as e:
+        logger.error(f"Error sending links to API via {callback_method}: {e}")
+        return False, 0, str(e)
+
+class CallbackOutbox:
+    """Delivers link callbacks queued in link_transactions, retrying failures with exponential backoff.
+
+    A row is pending while next_attempt_at is set. Workers claim due rows with
+    SKIP LOCKED and push next_attempt_at out by `lease`, so several processes
+    can share the outbox and a row whose worker died is picked up again.
+    """
+
+    def __init__(self, concurrency: int, max_attempts: int, poll_interval: float = 2, lease: float = 120):
+        self._concurrency = max(concurrency, 1)
+        self._max_attempts = max_attempts
+        self._poll_interval = poll_interval
+        self._lease = timedelta(seconds=lease)
+        self._wake = Event()
+        self._task: Task | None = None
+
+    def wake(self):
+        """Deliver newly queued callbacks now instead of at the next poll"""
+        self._wake.set()
+
+    async def _claim(self) -> list:
+        async with AsyncSessionLocal() as session:
+            due = (
+                select(LinkTransaction.id)
+                .where(LinkTransaction.next_attempt_at <= func.now())
+                .order_by(LinkTransaction.next_attempt_at)
+                .limit(self._concurrency)
+                .with_for_update(skip_locked=True)
+            )
+            result = await session.execute(
+                update(LinkTransaction)
+                .where(LinkTransaction.id.in_(due.scalar_subquery()))
+                .values(next_attempt_at=func.now() + self._lease)
+                .returning(
+                    LinkTransaction.id,
+                    LinkTransaction.android_id,
+                    LinkTransaction.stream_link,
+                    LinkTransaction.download_link,
+                    LinkTransaction.callback_url,
+                    LinkTransaction.callback_method,
+                    LinkTransaction.attempts
+                )
+            )
+            rows = result.all()
+            await session.commit()
+            return rows
+
+    async def deliver_due(self) -> int:
+        """Attempt every callback that is due, up to `concurrency` at once; returns how many were attempted"""
+        rows = await self._claim()
+        if not rows:
+            return 0
+
+        results = await gather(*(
+            send_links_to_api(row.android_id, row.stream_link, row.download_link, row.callback_url, row.callback_method or 'POST')
+            for row in rows
+        ))
+
+        async with AsyncSessionLocal() as session:
+            for row, (success, status_code, response_text) in zip(rows, results):
+                attempts = (row.attempts or 0) + 1
+                if success or attempts >= self._max_attempts:
+                    next_attempt_at = None
+                    if not success:
+                        logger.warning(f"Giving up on callback for transaction {row.id} after {attempts} attempts")
+                else:
+                    next_attempt_at = func.now() + timedelta(seconds=min(5 * 2 ** attempts, 3600))
+
+                await session.execute(
+                    update(LinkTransaction)
+                    .where(LinkTransaction.id == row.id)
+                    .values(
+                        delivered=success,
+                        callback_status=status_code,
+                        callback_response=response_text[:4000],
+                        attempts=attempts,
+                        next_attempt_at=next_attempt_at
+                    )
+                )
+            await session.commit()
+
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                attempted = await self.deliver_due()
+            except Exception as e:
+                logger.error(f"Error delivering callbacks: {e}")
+                attempted = 0
+
+            # A full batch means more may be due right away
+            if attempted < self._concurrency:
+                try:
+                    await wait_for(self._wake.wait(), self._poll_interval)
+                except TimeoutError:
+                    pass
+                self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    async def stop(self):
+        # Callbacks still in flight are retried once their lease runs out
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+            self._task = None
+
+callback_outbox = CallbackOutbox(
+    concurrency=Server.CALLBACK_CONCURRENCY,
+    max_attempts=Server.CALLBACK_MAX_ATTEMPTS
+)
@@ -0,0 +1,128 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Any, NamedTuple
+from sqlalchemy import ColumnElement, Select, select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from bot.config import Telegram
+from bot.models import BankAccount, File, Publisher, WithdrawalRequest
+
+# Every loader here costs a fixed number of round-trips, however many rows the view shows
+
+PAGE_SIZE = 50
+# Shorter substrings hold no trigram, so the pg_trgm index cannot narrow them down
+MIN_HASH_SEARCH = 3
+
+class Page(NamedTuple):
+    rows: list[Any]
+    # Opaque position after the last row, None on the last page
+    next_cursor: str | None
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return urlsafe_b64encode(f'{created_at.isoformat()}|{row_id}'.encode()).rstrip(b'=').decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """The (timestamp, id) a cursor points after; ValueError when it was not made by encode_cursor"""
+    created_at, row_id = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+    return datetime.fromisoformat(created_at), int(row_id)
+
+async def keyset_page(
+    session: AsyncSession,
+    query: Select,
+    created_at: InstrumentedAttribute,
+    row_id: InstrumentedAttribute,
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE
+) -> Page:
+    """One page of `query`, newest first, resuming after `cursor`.
+
+    The position is the (created_at, id) of the last row seen, so each page is an
+    index range scan no matter how deep it is; the first entity of each row is the keyed one.
+    """
+    if cursor:
+        query = query.where(tuple_(created_at, row_id) < tuple_(*decode_cursor(cursor)))
+
+    result = await session.execute(query.order_by(created_at.desc(), row_id.desc()).limit(limit + 1))
+    rows = result.all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+
+    rows = rows[:limit]
+    last = rows[-1][0]
+    return Page(rows, encode_cursor(getattr(last, created_at.key), getattr(last, row_id.key)))
+
+def access_code_matches(search: str) -> ColumnElement[bool]:
+    """Files whose hash id contains `search`; a full-length hash id is looked up exactly on the unique index"""
+    if len(search) == Telegram.SECRET_CODE_LENGTH * 2:
+        # Hash ids are lower-case hex, so a pasted upper-case one still matches
+        return File.access_code == search.lower()
+
+    escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return File.access_code.ilike(f'%{escaped}%', escape='\\')
+
+async def publisher_files_page(
+    session: AsyncSession,
+    publisher_id: int,
+    cursor: str | None = None,
+    search: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None
+) -> Page:
+    """A page of one publisher's files, newest first"""
+    query = select(File).where(File.publisher_id == publisher_id)
+    if search:
+        query = query.where(access_code_matches(search))
+    if created_from:
+        query = query.where(File.created_at >= created_from)
+    if created_to:
+        query = query.where(File.created_at <= created_to)
+
+    page = await keyset_page(session, query, File.created_at, File.id, cursor)
+    return Page([file for file, in page.rows], page.next_cursor)
+
+async def search_files(session: AsyncSession, search: str, limit: int = PAGE_SIZE) -> list[tuple[File, str | None]]:
+    """The newest files of any publisher whose hash id contains `search`, each with its publisher's email"""
+    result = await session.execute(
+        select(File, Publisher.email)
+        .outerjoin(Publisher, Publisher.id == File.publisher_id)
+        .where(access_code_matches(search))
+        .order_by(File.created_at.desc(), File.id.desc())
+        .limit(limit)
+    )
+    return [(file, email) for file, email in result.all()]
+
+async def publishers_page(session: AsyncSession, cursor: str | None = None) -> Page:
+    """A page of publishers, newest first"""
+    page = await keyset_page(session, select(Publisher), Publisher.created_at, Publisher.id, cursor)
+    return Page([publisher for publisher, in page.rows], page.next_cursor)
+
+async def publishers_with_file_counts(session: AsyncSession, cursor: str | None = None) -> Page:
+    """A page of publishers, newest first, each paired with the number of files it owns"""
+    # Counted per row of the page through the publisher_id index, never across all files
+    file_count = select(func.count(File.id)).where(File.publisher_id == Publisher.id).scalar_subquery()
+    page = await keyset_page(session, select(Publisher, file_count), Publisher.created_at, Publisher.id, cursor)
+    return Page([(publisher, count) for publisher, count in page.rows], page.next_cursor)
+
+async def withdrawals_with_accounts(session: AsyncSession, status: str | None = None, cursor: str | None = None) -> Page:
+    """A page of withdrawal requests, newest first, each with its publisher and bank account (None when missing)"""
+    query = (
+        select(WithdrawalRequest, Publisher, BankAccount)
+        .outerjoin(Publisher, Publisher.id == WithdrawalRequest.publisher_id)
+        .outerjoin(BankAccount, BankAccount.id == WithdrawalRequest.bank_account_id)
+    )
+    if status:
+        query = query.where(WithdrawalRequest.status == status)
+
+    page = await keyset_page(session, query, WithdrawalRequest.requested_at, WithdrawalRequest.id, cursor)
+    return Page([
+        {'withdrawal': withdrawal, 'publisher': publisher, 'bank_account': bank_account}
+        for withdrawal, publisher, bank_account in page.rows
+    ], page.next_cursor)
+
+async def withdrawal_status_counts(session: AsyncSession) -> dict[str, int]:
+    """Number of withdrawal requests per status"""
+    result = await session.execute(
+        select(WithdrawalRequest.status, func.count(WithdrawalRequest.id))
+        .group_by(WithdrawalRequest.status)
+    )
+    return {status: count for status, count in result.all()}
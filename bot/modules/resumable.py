@@ -0,0 +1,122 @@
+from asyncio import Lock
+from time import monotonic
+from typing import AsyncIterable
+from bot.config import Server
+from bot.modules.affinity import local_id
+from bot.models import File
+from bot.modules.uploader import MAX_UPLOAD_SIZE, StreamUploader, UploadError, publish_upload
+
+class UploadSession:
+    """One resumable upload whose bytes are forwarded to Telegram as they are appended"""
+
+    def __init__(self, filename: str, size: int, publisher_id: int | None):
+        self.id = local_id(24)
+        self.size = size
+        self.publisher_id = publisher_id
+        self.uploader = StreamUploader(filename)
+        self.lock = Lock()
+        self.error: str | None = None
+        self.finalizing = False
+        self.touched = monotonic()
+
+    @property
+    def offset(self) -> int:
+        return self.uploader.size
+
+    def status(self) -> dict:
+        return {
+            'upload_id': self.id,
+            'offset': self.offset,
+            'size': self.size,
+            'progress': round(self.offset * 100 / self.size, 1)
+        }
+
+class UploadSessions:
+    """In-memory registry of resumable uploads, expired after `ttl` idle seconds"""
+
+    def __init__(self, ttl: float, limit: int):
+        self._ttl = ttl
+        self._limit = limit
+        self._sessions: dict[str, UploadSession] = {}
+
+    def _sweep(self):
+        now = monotonic()
+        for upload in list(self._sessions.values()):
+            if now - upload.touched > self._ttl and not upload.lock.locked() and not upload.finalizing:
+                self.discard(upload)
+
+    def create(self, filename: str, size: int, publisher_id: int | None) -> UploadSession:
+        if size <= 0:
+            raise UploadError('Uploaded file is empty')
+        if size > MAX_UPLOAD_SIZE:
+            raise UploadError('File size exceeds 2 GB limit')
+
+        self._sweep()
+        if len(self._sessions) >= self._limit:
+            raise UploadError('Too many uploads in progress, try again later', 429)
+
+        upload = UploadSession(filename, size, publisher_id)
+        self._sessions[upload.id] = upload
+        return upload
+
+    def get(self, upload_id: str, publisher_id: int | None) -> UploadSession | None:
+        upload = self._sessions.get(upload_id)
+        if upload is None or upload.publisher_id != publisher_id:
+            return None
+
+        upload.touched = monotonic()
+        return upload
+
+    async def append(self, upload: UploadSession, offset: int, body: AsyncIterable[bytes]) -> int:
+        """Forward a chunk starting at `offset`; a dropped request keeps every byte received so far"""
+        if upload.lock.locked():
+            raise UploadError('Another request is already appending to this upload', 409)
+
+        async with upload.lock:
+            if upload.error:
+                raise UploadError(upload.error, 410)
+            if offset != upload.offset:
+                raise UploadError(f'Expected offset {upload.offset}', 409)
+
+            try:
+                async for data in body:
+                    if upload.offset + len(data) > upload.size:
+                        raise UploadError('Upload exceeds the declared size')
+                    await upload.uploader.write(data)
+                    upload.touched = monotonic()
+            except UploadError as e:
+                # A part Telegram never accepted cannot be replayed, the upload has to restart
+                if e.status >= 500:
+                    upload.error = str(e)
+                raise
+
+        return upload.offset
+
+    def claim(self, upload: UploadSession):
+        """Reserve a complete upload for finalizing; raises if it is incomplete or already claimed"""
+        if upload.lock.locked() or upload.finalizing:
+            raise UploadError('Another request is already using this upload', 409)
+        if upload.error:
+            raise UploadError(upload.error, 410)
+        if upload.offset != upload.size:
+            raise UploadError(f'Upload is incomplete, expected offset {upload.offset}', 409)
+
+        upload.finalizing = True
+
+    async def finalize(self, upload: UploadSession) -> File:
+        """Upload the remaining parts, post the file and record it"""
+        if not upload.finalizing:
+            self.claim(upload)
+
+        async with upload.lock:
+            try:
+                await upload.uploader.finish()
+                return await publish_upload(upload.uploader, publisher_id=upload.publisher_id)
+            finally:
+                self._sessions.pop(upload.id, None)
+
+    def discard(self, upload: UploadSession):
+        self._sessions.pop(upload.id, None)
+        upload.uploader.abort()
+
+upload_sessions = UploadSessions(ttl=Server.UPLOAD_SESSION_TTL, limit=Server.UPLOAD_SESSION_LIMIT)
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.models import File, LinkRevocation
+from bot.modules.notify import publish, subscribe
+from bot.modules.signing import signed_links
+from bot.modules.telegram import invalidate_message
+from bot.modules.tokens import token_index
+
+async def record_revocation(session: AsyncSession, file: File):
+    """Persist a revocation for the signed links of a file, committed together with the caller's change"""
+    # No link signed before now outlives the longest expiry /api/postback hands out for this file
+    lifetime = (file.video_duration + 3600) if file.video_duration else 7200
+    session.add(LinkRevocation(
+        file_id=file.id,
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=lifetime)
+    ))
+    # Other processes drop their traces of the file on commit
+    await publish(session, 'file_revoked', f'{file.id}:{file.telegram_message_id}')
+
+def _forget(file_id: int, message_id: int):
+    invalidate_message(message_id)
+    token_index.revoke_file(file_id)
+    signed_links.revoked.add(file_id)
+
+def file_revoked(file: File):
+    """Drop every in-process trace of a file that was deleted or deactivated"""
+    _forget(file.id, file.telegram_message_id)
+
+async def _on_revoked(payload: str | None):
+    if payload is None:
+        # The token index reloads itself on its own notification
+        await signed_links.load()
+        return
+
+    file_id, message_id = payload.split(':')
+    _forget(int(file_id), int(message_id))
+
+subscribe('file_revoked', _on_revoked)
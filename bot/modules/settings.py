@@ -0,0 +1,43 @@
+from asyncio import Task, create_task, current_task, shield
+from bot.database import AsyncSessionLocal
+from bot.models import Settings
+from bot.modules.notify import subscribe
+from sqlalchemy import select
+
+class SettingsCache:
+    """Process-wide snapshot of the Settings row, dropped whenever an admin saves settings"""
+
+    def __init__(self):
+        self._settings: Settings | None = None
+        self._loaded = False
+        self._loading: Task | None = None
+
+    async def _load(self) -> Settings | None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Settings))
+            settings = result.scalar_one_or_none()
+
+        # An invalidation that arrived while loading makes this result stale
+        if self._loading is current_task():
+            self._settings = settings
+            self._loaded = True
+
+        return settings
+
+    async def get(self) -> Settings | None:
+        """Return the cached Settings; treat the result as read-only"""
+        if self._loaded:
+            return self._settings
+
+        if self._loading is None or self._loading.done():
+            self._loading = create_task(self._load())
+
+        return await shield(self._loading)
+
+    def invalidate(self, _payload: str | None = None):
+        self._settings = None
+        self._loaded = False
+        self._loading = None
+
+settings_cache = SettingsCache()
+subscribe('settings', settings_cache.invalidate)
@@ -0,0 +1,83 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timezone
+from hashlib import sha256
+from logging import getLogger
+import hmac
+from bot.config import Server
+from bot.database import AsyncSessionLocal
+from bot.models import LinkRevocation
+from bot.modules.tokens import LinkTokens
+from sqlalchemy import select, delete
+
+logger = getLogger('bot.signing')
+
+def _b64encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+class SignedLinks:
+    """Stateless stream/download tokens of the form <file_id>.<expiry>.<android_id>.<signature>"""
+
+    def __init__(self, key: str | None):
+        self._key = key.encode() if key else None
+        self.revoked: set[int] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self._key is not None
+
+    @staticmethod
+    def is_signed(token: str) -> bool:
+        # Stored tokens are plain hex, signed ones always contain dots
+        return '.' in token
+
+    def _signature(self, kind: str, message_id: int, file_id: int, expiry: int, android_id: str) -> str:
+        payload = f'{kind}:{message_id}:{file_id}:{expiry}:{android_id}'.encode()
+        return _b64encode(hmac.new(self._key, payload, sha256).digest())
+
+    def sign(self, kind: str, message_id: int, file_id: int, expiry: datetime, android_id: str) -> str:
+        timestamp = int(expiry.timestamp())
+        signature = self._signature(kind, message_id, file_id, timestamp, android_id)
+        return f'{file_id}.{timestamp}.{_b64encode(android_id.encode())}.{signature}'
+
+    def verify(self, kind: str, message_id: int, token: str) -> LinkTokens | None:
+        """Check a signed token for the given channel message without touching the database"""
+        if not self.enabled:
+            return None
+
+        try:
+            file_id, timestamp, android_id, signature = token.split('.')
+            file_id, timestamp = int(file_id), int(timestamp)
+            android_id = _b64decode(android_id).decode()
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+        if not hmac.compare_digest(signature, self._signature(kind, message_id, file_id, timestamp, android_id)):
+            return None
+
+        expiry = datetime.fromtimestamp(timestamp, timezone.utc)
+        return LinkTokens(
+            file_id=file_id,
+            message_id=message_id,
+            stream_token=self.sign('stream', message_id, file_id, expiry, android_id),
+            download_token=self.sign('download', message_id, file_id, expiry, android_id),
+            expiry=expiry,
+            is_active=file_id not in self.revoked
+        )
+
+    async def load(self):
+        """Load the revocations of links that may still be unexpired"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(LinkRevocation).where(LinkRevocation.expires_at < datetime.now(timezone.utc))
+            )
+            result = await session.execute(select(LinkRevocation.file_id))
+            self.revoked = set(result.scalars())
+            await session.commit()
+
+        if self.revoked:
+            logger.info(f'Loaded {len(self.revoked)} signed link revocations')
+
+signed_links = SignedLinks(Server.LINK_SIGNING_KEY)
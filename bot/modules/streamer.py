@@ -0,0 +1,178 @@
+from asyncio import Task, create_task, sleep
+from collections import deque
+from math import ceil
+from time import monotonic
+from typing import AsyncGenerator, Callable
+from logging import getLogger
+from telethon.errors import FloodWaitError, FileReferenceExpiredError, RPCError
+from telethon.tl.custom import Message
+from bot.config import Server
+from bot.modules.chunk_cache import chunk_cache
+from bot.modules.clients import DownloadClient, client_pool
+from bot.modules.telegram import get_message, invalidate_message
+
+logger = getLogger('bot.streamer')
+
+CHUNK_SIZE = 1024 * 1024
+
+class ChunkUnavailable(Exception):
+    """No client could download a chunk; the response must fail rather than come out short"""
+
+async def download_chunk(message: Message, index: int, file_size: int) -> bytes:
+    """Fetch a single aligned chunk of a channel file over the least loaded client, moving on when one fails"""
+    size = min(CHUNK_SIZE, file_size - index * CHUNK_SIZE)
+    tried: set[DownloadClient] = set()
+
+    while (member := client_pool.pick(tried)) is not None:
+        tried.add(member)
+        if member.flooded:
+            # Every client is waiting out a flood, this one is free soonest
+            await sleep(member.flood_until - monotonic())
+
+        own_message = await get_message(message.id, member.client)
+        if own_message is None:
+            continue
+
+        chunk = b''
+        member.in_flight += size
+        try:
+            # limit=1 makes the iterator exhaust itself, so the borrowed sender is returned
+            async for data in member.client.iter_download(own_message, offset=index * CHUNK_SIZE, chunk_size=CHUNK_SIZE, limit=1, file_size=file_size):  # type: ignore
+                chunk = data
+        except FloodWaitError as e:
+            client_pool.flood_wait(member, e.seconds)
+            continue
+        except FileReferenceExpiredError:
+            # Fetched again with a fresh reference the next time the message is needed
+            invalidate_message(message.id)
+            logger.warning(f'File reference of message {message.id} expired on {member.name}, failing over')
+            continue
+        except (RPCError, ConnectionError, TimeoutError) as e:
+            logger.warning(f'Chunk {index} of message {message.id} failed on {member.name}, failing over: {e!r}')
+            continue
+        finally:
+            member.in_flight -= size
+
+        if len(chunk) == size:
+            return chunk
+        logger.warning(f'{member.name} returned {len(chunk)} of {size} bytes for chunk {index} of message {message.id}')
+
+    raise ChunkUnavailable(f'No client could download chunk {index} of message {message.id}')
+
+async def fetch_chunk(message: Message, index: int, file_size: int) -> bytes | memoryview:
+    """Serve a chunk from the on-disk cache, downloading and caching it on a miss"""
+    cached = chunk_cache.get(message.id, index)
+    if cached is not None:
+        return cached
+
+    chunk = await download_chunk(message, index, file_size)
+    chunk_cache.store(message.id, index, chunk)
+    return chunk
+
+class ReadAheadBudget:
+    """Caps the memory held by chunks fetched before any reader asked for them, across all downloads"""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self.used = 0
+
+    def reserve(self, size: int) -> bool:
+        if self.used + size > self._limit:
+            return False
+        self.used += size
+        return True
+
+    def release(self, size: int):
+        self.used -= size
+
+read_ahead = ReadAheadBudget(Server.READ_AHEAD_MEMORY)
+# Chunks being warmed into the cache past the end of a finished range
+_prefetches: dict[tuple[int, int], Task] = {}
+
+async def _prefetch(message: Message, index: int, file_size: int):
+    try:
+        await fetch_chunk(message, index, file_size)
+    except Exception:
+        pass
+    finally:
+        read_ahead.release(CHUNK_SIZE)
+        _prefetches.pop((message.id, index), None)
+
+def prefetch_after(message: Message, end_index: int, file_size: int, count: int):
+    """Warm the chunk cache with the chunks that follow a range, for players that request the next range next"""
+    if not chunk_cache.enabled:
+        return
+
+    for index in range(end_index, min(end_index + count, segment_count(file_size))):
+        key = (message.id, index)
+        if key in _prefetches or chunk_cache.get(*key) is not None:
+            continue
+        if not read_ahead.reserve(CHUNK_SIZE):
+            return
+        _prefetches[key] = create_task(_prefetch(message, index, file_size))
+
+async def iter_chunks(message: Message, first_index: int, part_count: int, file_size: int, window: int = Server.DOWNLOAD_WINDOW) -> AsyncGenerator[bytes | memoryview, None]:
+    """Yield `part_count` chunks starting at `first_index` in order, keeping up to `window` requests in flight.
+
+    Only the chunk the reader waits for is fetched unconditionally; the ones
+    behind it are read-ahead and are started while the global budget allows.
+    """
+    # (task, whether it holds read-ahead budget)
+    pending: deque[tuple[Task, bool]] = deque()
+    next_index = first_index
+    end_index = first_index + part_count
+    finished = False
+
+    try:
+        while pending or next_index < end_index:
+            while next_index < end_index and len(pending) < max(window, 1):
+                reserved = bool(pending)
+                if reserved and not read_ahead.reserve(CHUNK_SIZE):
+                    break
+                pending.append((create_task(fetch_chunk(message, next_index, file_size)), reserved))
+                next_index += 1
+
+            task, reserved = pending.popleft()
+            try:
+                yield await task
+            finally:
+                # Sent to the client (or abandoned), so it no longer counts as read-ahead
+                if reserved:
+                    read_ahead.release(CHUNK_SIZE)
+        else:
+            finished = True
+    finally:
+        # Client went away or the range is done; drop the requests still in flight
+        for task, reserved in pending:
+            task.cancel()
+            if reserved:
+                read_ahead.release(CHUNK_SIZE)
+
+    if finished:
+        prefetch_after(message, end_index, file_size, window)
+
+# Containers whose chunks an HLS player can splice back together; MPEG-TS packets resync
+# on their own, so a segment may start and end mid-packet
+SEGMENTABLE_MIME_TYPES = {'video/mp2t'}
+
+def segment_count(file_size: int) -> int:
+    return -(-file_size // CHUNK_SIZE)
+
+def hls_playlist(file_size: int, duration: int, segment_url: Callable[[int], str]) -> str:
+    """VOD playlist with one segment per aligned chunk, durations estimated from the byte share of each"""
+    count = segment_count(file_size)
+    durations = [duration * min(CHUNK_SIZE, file_size - index * CHUNK_SIZE) / file_size for index in range(count)]
+
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        f'#EXT-X-TARGETDURATION:{ceil(max(durations))}',
+        '#EXT-X-MEDIA-SEQUENCE:0'
+    ]
+    for index, segment_duration in enumerate(durations):
+        lines.append(f'#EXTINF:{segment_duration:.3f},')
+        lines.append(segment_url(index))
+    lines.append('#EXT-X-ENDLIST')
+
+    return '\n'.join(lines) + '\n'
@@ -1,21 +1,67 @@
+from telethon import TelegramClient
 from telethon.events import NewMessage
 from telethon.tl.custom import Message
+from asyncio import Task, create_task, current_task, shield
+from collections import OrderedDict
 from datetime import datetime
 from mimetypes import guess_type
+from time import monotonic
 from bot import TelegramBot
-from bot.config import Telegram
+from bot.config import Telegram, Server
 from bot.server.error import abort
 
-async def get_message(message_id: int) -> Message | None:
+# (client, message_id) -> (expires_at, message), oldest first; every client sees its own copy
+# of a message, because the file references it carries are only valid for that client
+_message_cache: OrderedDict[tuple[TelegramClient, int], tuple[float, Message]] = OrderedDict()
+# In-flight lookups, so concurrent requests for one file share a single get_messages call
+_message_lookups: dict[tuple[TelegramClient, int], Task] = {}
+_clients: set[TelegramClient] = set()
+
+async def _fetch_message(client: TelegramClient, message_id: int) -> Message | None:
     message = None
+    key = (client, message_id)
     
     try:
-        message = await TelegramBot.get_messages(Telegram.CHANNEL_ID, ids=message_id)
+        message = await client.get_messages(Telegram.CHANNEL_ID, ids=message_id)
     except Exception:
         pass
 
+    if message and _message_lookups.get(key) is current_task():
+        _message_cache[key] = (monotonic() + Server.MESSAGE_CACHE_TTL, message)
+        _message_cache.move_to_end(key)
+        while len(_message_cache) > Server.MESSAGE_CACHE_SIZE:
+            _message_cache.popitem(last=False)
+
     return message
 
+async def get_message(message_id: int, client: TelegramClient = TelegramBot) -> Message | None:
+    key = (client, message_id)
+    cached = _message_cache.get(key)
+    if cached and cached[0] > monotonic():
+        return cached[1]
+
+    task = _message_lookups.get(key)
+    if task is None:
+        _clients.add(client)
+        task = create_task(_fetch_message(client, message_id))
+        _message_lookups[key] = task
+
+        def forget_lookup(_):
+            if _message_lookups.get(key) is task:
+                del _message_lookups[key]
+
+        task.add_done_callback(forget_lookup)
+
+    # A cancelled request must not cancel the lookup other requests are waiting on
+    return await shield(task)
+
+def invalidate_message(message_id: int):
+    """Forget a cached message, e.g. after it was revoked or deleted"""
+    for client in _clients:
+        _message_cache.pop((client, message_id), None)
+        # Results of a lookup started before the invalidation are not cached
+        _message_lookups.pop((client, message_id), None)
+
 async def send_file_with_caption(message: Message, caption: str, send_to: int = Telegram.CHANNEL_ID) -> Message:
     return await TelegramBot.send_file(entity=send_to, file=message, caption=caption)
 
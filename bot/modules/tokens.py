@@ -0,0 +1,170 @@
+from typing import NamedTuple
+from datetime import datetime, timezone
+from logging import getLogger
+from time import monotonic
+from bot.database import AsyncSessionLocal
+from bot.models import File
+from bot.modules.notify import publish, subscribe
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = getLogger('bot.tokens')
+
+class LinkTokens(NamedTuple):
+    file_id: int
+    message_id: int
+    stream_token: str
+    download_token: str
+    expiry: datetime
+    is_active: bool
+
+    @property
+    def expired(self) -> bool:
+        return datetime.now(timezone.utc) > self.expiry
+
+class TokenIndex:
+    """In-memory index of the temporary stream/download tokens handed out by /api/postback"""
+
+    def __init__(self, sweep_interval: int = 60, miss_ttl: int = 10, max_misses: int = 10000):
+        self._by_token: dict[str, LinkTokens] = {}
+        self._by_file: dict[int, LinkTokens] = {}
+        # Tokens found in neither the index nor the database, until the monotonic time they are retried
+        self._misses: dict[str, float] = {}
+        self._miss_ttl = miss_ttl
+        self._max_misses = max_misses
+        self._sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+    def _add(self, entry: LinkTokens):
+        previous = self._by_file.get(entry.file_id)
+        if previous:
+            self._by_token.pop(previous.stream_token, None)
+            self._by_token.pop(previous.download_token, None)
+
+        self._by_file[entry.file_id] = entry
+        self._by_token[entry.stream_token] = entry
+        self._by_token[entry.download_token] = entry
+        self._misses.pop(entry.stream_token, None)
+        self._misses.pop(entry.download_token, None)
+
+    def _remove(self, entry: LinkTokens):
+        self._by_file.pop(entry.file_id, None)
+        self._by_token.pop(entry.stream_token, None)
+        self._by_token.pop(entry.download_token, None)
+
+    def _sweep(self):
+        if monotonic() < self._next_sweep:
+            return
+
+        self._next_sweep = monotonic() + self._sweep_interval
+        for entry in [entry for entry in self._by_file.values() if entry.expired]:
+            self._remove(entry)
+
+        now = monotonic()
+        self._misses = {token: until for token, until in self._misses.items() if until > now}
+
+    @staticmethod
+    def _from_record(record: File) -> LinkTokens:
+        return LinkTokens(
+            file_id=record.id,
+            message_id=record.telegram_message_id,
+            stream_token=record.temporary_stream_token,
+            download_token=record.temporary_download_token,
+            expiry=record.link_expiry_time,
+            is_active=record.is_active
+        )
+
+    async def load(self):
+        """Fill the index with every link that has not expired yet"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(File).where(
+                    File.temporary_stream_token.is_not(None),
+                    File.temporary_download_token.is_not(None),
+                    File.link_expiry_time > datetime.now(timezone.utc)
+                )
+            )
+            records = result.scalars().all()
+
+        # Rebuilt from scratch, so a reload also drops links revoked in the meantime
+        self._by_token = {}
+        self._by_file = {}
+        for record in records:
+            self._add(self._from_record(record))
+
+        logger.info(f'Token index loaded with {len(self._by_file)} active links')
+
+    def remember(self, record: File):
+        """Index the tokens just written to a file record"""
+        self._sweep()
+        self._add(self._from_record(record))
+
+    async def share(self, session: AsyncSession, record: File):
+        """Have every other process index the tokens of a file record once the session commits"""
+        entry = self._from_record(record)
+        await publish(session, 'link_tokens', ','.join((
+            str(entry.file_id),
+            str(entry.message_id),
+            entry.stream_token,
+            entry.download_token,
+            str(entry.expiry.timestamp()),
+            '1' if entry.is_active else '0'
+        )))
+
+    async def on_shared(self, payload: str | None):
+        if payload is None:
+            await self.load()
+            return
+
+        file_id, message_id, stream_token, download_token, expiry, is_active = payload.split(',')
+        self._sweep()
+        self._add(LinkTokens(
+            file_id=int(file_id),
+            message_id=int(message_id),
+            stream_token=stream_token,
+            download_token=download_token,
+            expiry=datetime.fromtimestamp(float(expiry), timezone.utc),
+            is_active=is_active == '1'
+        ))
+
+    async def resolve(self, kind: str, token: str) -> LinkTokens | None:
+        """Look up a 'stream' or 'download' token"""
+        entry = self._by_token.get(token)
+
+        if entry is None and self._misses.get(token, 0) <= monotonic():
+            # Not warmed up yet, or minted by another process whose notification has not
+            # arrived (or never will, while the listener is down): ask the database once
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(File).where(
+                        or_(File.temporary_stream_token == token, File.temporary_download_token == token)
+                    )
+                )
+                record = result.scalar_one_or_none()
+
+            if record and record.link_expiry_time:
+                entry = self._from_record(record)
+                self._add(entry)
+            else:
+                self._sweep()
+                if len(self._misses) >= self._max_misses:
+                    # Guessed tokens must not grow this without bound
+                    self._misses.clear()
+                self._misses[token] = monotonic() + self._miss_ttl
+
+        if entry is None:
+            return None
+
+        if (entry.stream_token if kind == 'stream' else entry.download_token) != token:
+            return None
+
+        return entry
+
+    def revoke_file(self, file_id: int):
+        """Mark the links of a deleted or deactivated file record as revoked"""
+        entry = self._by_file.get(file_id)
+        if entry:
+            self._add(entry._replace(is_active=False))
+
+token_index = TokenIndex()
+subscribe('link_tokens', token_index.on_shared)
@@ -0,0 +1,306 @@
+from asyncio import FIRST_COMPLETED, Lock, Task, create_task, sleep, wait
+from hashlib import md5, sha256
+from logging import getLogger
+from secrets import token_hex
+from typing import AsyncIterable
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError, RPCError, ServerError
+from telethon.helpers import generate_random_long
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+from telethon.tl.functions import InvokeWithLayerRequest
+from telethon.tl.functions.help import GetConfigRequest
+from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import InputFile, InputFileBig
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File as FilePart, MultipartDecoder, NeedData
+from werkzeug.utils import secure_filename
+from bot import TelegramBot
+from bot.config import Telegram, Server
+from bot.database import AsyncSessionLocal
+from bot.models import File
+from bot.modules.telegram import get_message, get_file_properties
+from bot.modules.dedup import reuse_upload
+
+logger = getLogger('bot.uploader')
+
+PART_SIZE = 512 * 1024
+# Files up to this size are uploaded as a small file once the whole body is in
+SMALL_FILE_LIMIT = 10 * 1024 * 1024
+MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024
+
+class UploadError(Exception):
+    """An upload failed; the message is safe to show to the uploader"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class SenderPool:
+    """Extra connections to the bot's home DC so upload parts are not queued behind one socket"""
+
+    def __init__(self, size: int, client: TelegramClient = TelegramBot):
+        self._size = size
+        self._client = client
+        self._senders: list[MTProtoSender] = []
+        self._next = 0
+        self._lock = Lock()
+
+    async def _connect(self) -> MTProtoSender:
+        client = self._client
+        dc = await client._get_dc(client.session.dc_id)
+        # The bot is already authorized on its home DC, so new connections reuse its auth key
+        sender = MTProtoSender(client.session.auth_key, loggers=client._log)
+        await sender.connect(client._connection(
+            dc.ip_address,
+            dc.port,
+            dc.id,
+            loggers=client._log,
+            proxy=client._proxy,
+            local_addr=client._local_addr
+        ))
+        client._init_request.query = GetConfigRequest()
+        await sender.send(InvokeWithLayerRequest(LAYER, client._init_request))
+        return sender
+
+    async def _acquire(self) -> MTProtoSender | None:
+        async with self._lock:
+            self._senders = [sender for sender in self._senders if sender.is_connected()]
+            if len(self._senders) < self._size:
+                try:
+                    self._senders.append(await self._connect())
+                    return self._senders[-1]
+                except Exception as e:
+                    logger.warning(f'Could not open upload connection: {e}')
+
+            if not self._senders:
+                return None
+
+            self._next = (self._next + 1) % len(self._senders)
+            return self._senders[self._next]
+
+    async def invoke(self, request):
+        """Send a request over the pooled connections in turn, or the client's own one when none can be opened"""
+        sender = await self._acquire()
+        if sender is None:
+            return await self._client(request)
+        return await sender.send(request)
+
+    async def close(self):
+        senders, self._senders = self._senders, []
+        for sender in senders:
+            await sender.disconnect()
+
+upload_senders = SenderPool(size=Server.UPLOAD_CONNECTIONS)
+
+class StreamUploader:
+    """Uploads a file of unknown size to Telegram part by part as its bytes arrive"""
+
+    def __init__(self, file_name: str, pool: SenderPool = upload_senders, window: int = Server.UPLOAD_WINDOW):
+        self.file_name = file_name
+        self.size = 0
+        self._pool = pool
+        self._window = max(window, 1)
+        self._file_id = generate_random_long()
+        self._buffer = bytearray()
+        self._md5 = md5()
+        self._sha256 = sha256()
+        self._big = False
+        self._parts_sent = 0
+        self._in_flight: set[Task] = set()
+        self.handle: InputFile | InputFileBig | None = None
+
+    @property
+    def content_hash(self) -> str:
+        return f'sha256:{self._sha256.hexdigest()}'
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_SIZE:
+            raise UploadError('File size exceeds 2 GB limit')
+
+        self._buffer += data
+        self._sha256.update(data)
+        if not self._big:
+            self._md5.update(data)
+            if len(self._buffer) <= SMALL_FILE_LIMIT:
+                return
+            self._big = True
+
+        # The last part has to carry the real part count, so one part is always held back
+        while len(self._buffer) > PART_SIZE:
+            await self._submit(SaveBigFilePartRequest(self._file_id, self._parts_sent, -1, bytes(self._buffer[:PART_SIZE])))
+            del self._buffer[:PART_SIZE]
+
+    async def _send_part(self, request):
+        for attempt in range(Server.UPLOAD_RETRIES + 1):
+            try:
+                if await self._pool.invoke(request):
+                    return
+                error = 'rejected'
+            except FloodWaitError as e:
+                error = e
+                await sleep(e.seconds)
+                continue
+            except (ServerError, ConnectionError, TimeoutError, OSError) as e:
+                error = e
+            except RPCError as e:
+                raise UploadError(f'Failed to upload file part {request.file_part}: {e}', 502)
+
+            logger.warning(f'Retrying file part {request.file_part} ({error})')
+            await sleep(min(2 ** attempt, 30))
+
+        raise UploadError(f'Failed to upload file part {request.file_part}', 502)
+
+    async def _collect(self, limit: int):
+        while len(self._in_flight) > limit:
+            done, self._in_flight = await wait(self._in_flight, return_when=FIRST_COMPLETED)
+            for task in done:
+                task.result()
+
+    async def _submit(self, request):
+        """Send a part concurrently, waiting while `window` parts are already in flight"""
+        await self._collect(self._window - 1)
+        self._in_flight.add(create_task(self._send_part(request)))
+        self._parts_sent += 1
+
+    def abort(self):
+        for task in self._in_flight:
+            task.cancel()
+        self._in_flight.clear()
+
+    async def finish(self) -> InputFile | InputFileBig:
+        """Upload whatever is buffered and return the handle to pass to send_file"""
+        if not self.size:
+            raise UploadError('Uploaded file is empty')
+
+        if self._big:
+            # Only announce the part count once every earlier part has arrived
+            await self._collect(0)
+            total_parts = self._parts_sent + 1
+            await self._send_part(SaveBigFilePartRequest(self._file_id, self._parts_sent, total_parts, bytes(self._buffer)))
+            self._buffer.clear()
+            self.handle = InputFileBig(self._file_id, total_parts, self.file_name)
+            return self.handle
+
+        for offset in range(0, len(self._buffer), PART_SIZE):
+            await self._submit(SaveFilePartRequest(self._file_id, self._parts_sent, bytes(self._buffer[offset:offset + PART_SIZE])))
+        await self._collect(0)
+
+        self._buffer.clear()
+        self.handle = InputFile(self._file_id, self._parts_sent, self.file_name, self._md5.hexdigest())
+        return self.handle
+
+async def upload_multipart(body: AsyncIterable[bytes], content_type: str | None, field: str) -> StreamUploader:
+    """Stream the file in multipart form field `field` to Telegram without touching the disk"""
+    mimetype, options = parse_options_header(content_type or '')
+    if mimetype != 'multipart/form-data' or 'boundary' not in options:
+        raise UploadError('No video file provided')
+
+    # Other form fields are small; only the file is streamed
+    decoder = MultipartDecoder(options['boundary'].encode('latin1'), max_form_memory_size=1024 * 1024)
+    uploader: StreamUploader | None = None
+    in_field = False
+    handle = None
+
+    async def drain():
+        nonlocal uploader, in_field, handle
+        while not isinstance(event := decoder.next_event(), NeedData):
+            if isinstance(event, FilePart):
+                in_field = event.name == field and uploader is None
+                if in_field:
+                    if not event.filename:
+                        raise UploadError('No file selected')
+                    uploader = StreamUploader(secure_filename(event.filename) or 'video_upload')
+            elif isinstance(event, Data):
+                if in_field:
+                    await uploader.write(event.data)
+                    if not event.more_data:
+                        handle = await uploader.finish()
+                        in_field = False
+            elif isinstance(event, Epilogue):
+                return True
+        return False
+
+    try:
+        async for data in body:
+            decoder.receive_data(data)
+            if await drain() or handle is not None:
+                break
+        else:
+            decoder.receive_data(None)
+            await drain()
+    finally:
+        if uploader is not None and handle is None:
+            uploader.abort()
+
+    if uploader is None:
+        raise UploadError('No video file provided')
+    if handle is None:
+        raise UploadError('Upload was interrupted')
+
+    return uploader
+
+async def publish_upload(uploader: StreamUploader, publisher_id: int | None = None) -> File:
+    """Post a finished upload to the storage channel and record it"""
+    # Identical content is already in the channel; the uploaded parts are simply never used
+    file_record = await reuse_upload(uploader.content_hash, publisher_id, uploader.file_name)
+    if file_record:
+        return file_record
+
+    secret_code = token_hex(Telegram.SECRET_CODE_LENGTH)
+
+    sent_message = await TelegramBot.send_file(
+        entity=Telegram.CHANNEL_ID,
+        file=uploader.handle,
+        caption=f'`{secret_code}`'
+    )
+    if isinstance(sent_message, list):
+        sent_message = sent_message[0]
+    message_id = sent_message.id
+
+    telegram_message = await get_message(message_id=message_id)
+    if not telegram_message:
+        logger.error(f"Could not retrieve message after upload: {message_id}")
+        raise UploadError('Failed to retrieve uploaded file', 500)
+
+    filename, file_size, mime_type = get_file_properties(telegram_message)
+
+    video_duration = None
+    media = telegram_message.video or telegram_message.document
+    for attr in getattr(media, 'attributes', None) or ():
+        duration = getattr(attr, 'duration', None)
+        if duration:
+            video_duration = duration
+            break
+
+    async with AsyncSessionLocal() as session:
+        try:
+            file_record = File(
+                telegram_message_id=message_id,
+                filename=filename,
+                file_size=file_size,
+                mime_type=mime_type,
+                access_code=secret_code,
+                video_duration=int(video_duration) if video_duration else None,
+                publisher_id=publisher_id,
+                content_hash=uploader.content_hash
+            )
+            session.add(file_record)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Error saving file to database: {e}")
+            raise UploadError('Database error', 500)
+
+    return file_record
+
+def upload_result(file_record: File) -> dict:
+    """Response body of the upload endpoints once a file is recorded"""
+    return {
+        'status': 'success',
+        'hash_id': file_record.access_code,
+        'play_link': f'{Server.BASE_URL}/play/{file_record.access_code}',
+        'filename': file_record.filename,
+        'message': 'Video uploaded successfully'
+    }
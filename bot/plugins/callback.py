@@ -2,26 +2,51 @@ from telethon.events import CallbackQuery
 from bot import TelegramBot
 from bot.modules.decorators import verify_user
 from bot.modules.static import *
-from bot.modules.telegram import get_message
+from bot.modules.telegram import get_message, invalidate_message
+from bot.modules.chunk_cache import chunk_cache
+from bot.modules.revocation import record_revocation, file_revoked
+from bot.modules.dedup import lock_message, message_in_use
+from bot.modules.notify import publish
 from bot.database import AsyncSessionLocal
 from bot.models import File
 from sqlalchemy import select
 
-async def delete_file_from_db(message_id: int):
-    """Delete file record from database"""
+async def delete_file_from_db(message_id: int, access_code: str, caption: str) -> bool | None:
+    """Delete file record from database; returns whether other records still use its message.
+
+    Without a record the code must match the message caption, otherwise None is returned.
+    """
     async with AsyncSessionLocal() as session:
         try:
+            # Deduplicated uploads may be attaching themselves to this message right now
+            await lock_message(session, message_id)
             result = await session.execute(
-                select(File).where(File.telegram_message_id == message_id)
+                select(File).where(File.telegram_message_id == message_id, File.access_code == access_code)
             )
             file_record = result.scalar_one_or_none()
+            if not file_record and access_code != caption:
+                await session.rollback()
+                return None
+
             if file_record:
+                await record_revocation(session, file_record)
                 await session.delete(file_record)
-                await session.commit()
-                print(f"Deleted file record for message {message_id}")
+                await session.flush()
+            # Duplicates of the first upload may still point at the message without a record of its own
+            in_use = await message_in_use(session, message_id)
+            if not in_use:
+                # Web worker processes drop their cached chunks of the message, which is deleted next
+                await publish(session, 'message_deleted', str(message_id))
+            await session.commit()
+            if file_record:
+                file_revoked(file_record)
+                print(f"Deleted file record {access_code} for message {message_id}")
+            return in_use
         except Exception as e:
             await session.rollback()
             print(f"Error deleting file from database: {e}")
+            # Keep the message rather than risk orphaning other records
+            return True
 
 @TelegramBot.on(CallbackQuery(pattern=r'^rm_'))
 @verify_user(private=True)
@@ -35,12 +60,16 @@ async def delete_file(event: CallbackQuery.Event):
 
     if not message:
         return await event.answer(MessageNotExist, alert=True)
-    if query_data[2] != message.raw_text:
+
+    # The caption only holds the code of the first upload, so duplicates are checked in the database
+    in_use = await delete_file_from_db(message.id, query_data[2], message.raw_text)
+    if in_use is None:
         return await event.answer(InvalidQueryText, alert=True)
 
-    await message.delete()
-    
-    # Also delete from database
-    await delete_file_from_db(int(query_data[1]))
+    # The message is only removed with the last file that points at it
+    if not in_use:
+        await message.delete()
+        invalidate_message(message.id)
+        await chunk_cache.discard(message.id)
 
-    return await event.answer(LinkRevokedText, alert=True)
\ No newline at end of file
+    return await event.answer(LinkRevokedText, alert=True)
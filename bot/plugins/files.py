@@ -6,13 +6,15 @@ from bot import TelegramBot
 from bot.config import Telegram, Server
 from bot.modules.decorators import verify_user
 from bot.modules.telegram import send_file_with_caption, filter_files
+from bot.modules.dedup import reuse_upload
+from bot.modules.jobs import upload_queue
 from bot.modules.static import *
 from bot.database import AsyncSessionLocal
 from bot.models import File, User, Publisher
 from sqlalchemy import select
 import asyncio
 
-async def save_file_to_db(message_id: int, filename: str, file_size: int, mime_type: str, access_code: str, video_duration = None, publisher_id = None):
+async def save_file_to_db(message_id: int, filename: str, file_size: int, mime_type: str, access_code: str, video_duration = None, publisher_id = None, content_hash = None):
     """Save file information to database"""
     async with AsyncSessionLocal() as session:
         try:
@@ -23,7 +25,8 @@ async def save_file_to_db(message_id: int, filename: str, file_size: int, mime_t
                 mime_type=mime_type,
                 access_code=access_code,
                 video_duration=int(video_duration) if video_duration else None,
-                publisher_id=publisher_id
+                publisher_id=publisher_id,
+                content_hash=content_hash
             )
             session.add(file_record)
             await session.commit()
@@ -98,10 +101,19 @@ async def user_file_handler(event: NewMessage.Event | Message):
         last_name=getattr(event.sender, 'last_name', None)
     )
     
-    secret_code = token_hex(Telegram.SECRET_CODE_LENGTH)
-    message = await send_file_with_caption(event.message, f'`{secret_code}`')
-    message_id = message.id
+    # Copying to the channel runs in the upload queue so the event handler returns right away
+    upload_queue.submit(publisher_id, lambda: store_file(event, publisher_id))
 
+async def store_file(event: NewMessage.Event | Message, publisher_id: int):
+    """Upload job for a file sent to the bot; tells the publisher when it fails"""
+    try:
+        await copy_file(event, publisher_id)
+    except Exception:
+        await event.reply("❌ **Upload Failed**\n\nSomething went wrong while saving your file, please send it again.")
+        raise
+
+async def copy_file(event: NewMessage.Event | Message, publisher_id: int):
+    """Copy a publisher's file to the channel, record it and reply with its links"""
     # Get file properties for database
     filename = 'Unknown'
     video_duration = None
@@ -125,16 +137,29 @@ async def user_file_handler(event: NewMessage.Event | Message):
     file_size = getattr(event.document, 'size', 0) if event.document else (getattr(event.video, 'size', 0) if event.video else 0)
     mime_type = getattr(event.document, 'mime_type', 'application/octet-stream') if event.document else (getattr(event.video, 'mime_type', 'video/mp4') if event.video else 'media/unknown')
 
-    # Save file to database
-    await save_file_to_db(
-        message_id=message_id,
-        filename=filename,
-        file_size=file_size,
-        mime_type=mime_type,
-        access_code=secret_code,
-        video_duration=video_duration,
-        publisher_id=publisher_id
-    )
+    # A document the channel already holds is not copied again
+    content_hash = f'tg:{event.document.id}' if event.document else None
+    file_record = await reuse_upload(content_hash, publisher_id, filename) if content_hash else None
+
+    if file_record:
+        secret_code = file_record.access_code
+        message_id = file_record.telegram_message_id
+    else:
+        secret_code = token_hex(Telegram.SECRET_CODE_LENGTH)
+        message = await send_file_with_caption(event.message, f'`{secret_code}`')
+        message_id = message.id
+
+        # Save file to database
+        await save_file_to_db(
+            message_id=message_id,
+            filename=filename,
+            file_size=file_size,
+            mime_type=mime_type,
+            access_code=secret_code,
+            video_duration=video_duration,
+            publisher_id=publisher_id,
+            content_hash=content_hash
+        )
 
     file_link = f'{Server.BASE_URL}/play/{secret_code}'
     
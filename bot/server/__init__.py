@@ -3,25 +3,63 @@ from uvicorn import Server as UvicornServer, Config
 from logging import getLogger
 from bot.config import Server, LOGGER_CONFIG_JSON
 from bot.database import init_db, close_db
+from bot.modules.chunk_cache import chunk_cache
+from bot.modules.clients import client_pool
+from bot.modules.tokens import token_index
+from bot.modules.signing import signed_links
+from bot.modules.access_log import access_log_writer
+from bot.modules.ledger import impression_settler
+from bot.modules.notify import listener
+from bot.modules.ads import ad_engine
+from bot.modules.uploader import upload_senders
+from bot.modules.jobs import upload_queue
+from bot.modules.outbox import callback_outbox
+from bot.modules.http import close_http_client
 from secrets import token_hex
 
-from . import main, error, auth, admin, publisher, ad_api
+from . import main, error, auth, admin, publisher, ad_api, uploads
+from .body import BoundedRequest, BoundedHTTPConnection
 
 logger = getLogger('uvicorn')
 instance = Quart(__name__)
+# Streamed uploads pause reading from the client instead of buffering the whole body
+instance.request_class = BoundedRequest
+instance.asgi_http_class = BoundedHTTPConnection
 instance.config['RESPONSE_TIMEOUT'] = None
 instance.config['REQUEST_TIMEOUT'] = None
 instance.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024 * 1024
-instance.config['SECRET_KEY'] = token_hex(32)
+instance.config['SECRET_KEY'] = Server.SECRET_KEY or token_hex(32)
 
 @instance.before_serving
 async def before_serve():
-    await init_db()
+    # Web workers are started once the bot process has migrated the database
+    if Server.WORKER_INDEX is None:
+        await init_db()
+    await chunk_cache.load()
+    await client_pool.start()
+    await token_index.load()
+    await signed_links.load()
+    await ad_engine.load_counts()
+    access_log_writer.start()
+    impression_settler.start()
+    ad_engine.start()
+    listener.start()
+    upload_queue.start()
+    callback_outbox.start()
     logger.info('Web server is started!')
     logger.info(f'Server running on {Server.BIND_ADDRESS}:{Server.PORT}')
 
 @instance.after_serving
 async def after_serve():
+    await upload_queue.stop()
+    await access_log_writer.stop()
+    await impression_settler.stop()
+    await ad_engine.stop()
+    await listener.stop()
+    await callback_outbox.stop()
+    await close_http_client()
+    await upload_senders.close()
+    await client_pool.stop()
     await close_db()
     logger.info('Web server is shutting down!')
 
@@ -30,6 +68,7 @@ instance.register_blueprint(auth.bp)
 instance.register_blueprint(admin.bp)
 instance.register_blueprint(publisher.bp)
 instance.register_blueprint(ad_api.bp)
+instance.register_blueprint(uploads.bp)
 
 @instance.errorhandler(400)
 async def handle_invalid_request(e):
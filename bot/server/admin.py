@@ -1,9 +1,18 @@
 from quart import Blueprint, request, render_template, redirect, session, jsonify
 from bot.database import AsyncSessionLocal
-from bot.models import Publisher, File, AdNetwork, Settings, WithdrawalRequest, BankAccount
+from bot.models import Publisher, PublisherDailyStats, File, AdNetwork, Settings, WithdrawalRequest, BankAccount
+from bot.modules.revocation import record_revocation, file_revoked
+from bot.modules.settings import settings_cache
+from bot.modules.notify import publish
+from bot.modules.ads import ad_engine
+from bot.modules.queries import (
+    MIN_HASH_SEARCH, publisher_files_page, publishers_page, publishers_with_file_counts, search_files,
+    withdrawals_with_accounts, withdrawal_status_counts
+)
 from sqlalchemy import select, func
 from datetime import datetime
 from os import environ
+from urllib.parse import urlencode
 import bcrypt
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -33,17 +42,30 @@ async def dashboard():
             select(func.count(File.id))
         )
         
-        result = await db_session.execute(
-            select(Publisher).order_by(Publisher.created_at.desc())
-        )
-        publishers = result.scalars().all()
+        page = await publishers_page(db_session)
         
     return await render_template('admin_dashboard.html', 
                                   active_page='dashboard',
-                                  publishers=publishers,
+                                  publishers=page.rows,
+                                  next_cursor=page.next_cursor,
                                   publisher_count=publisher_count,
                                   file_count=file_count)
 
+@bp.route('/dashboard/page')
+@require_admin
+async def dashboard_page():
+    async with AsyncSessionLocal() as db_session:
+        try:
+            page = await publishers_page(db_session, request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+        
+    return jsonify({
+        'status': 'success',
+        'html': await render_template('admin_dashboard_rows.html', publishers=page.rows),
+        'next_cursor': page.next_cursor
+    })
+
 @bp.route('/register-publisher', methods=['POST'])
 @require_admin
 async def register_publisher():
@@ -60,10 +82,8 @@ async def register_publisher():
         file_count = await db_session.scalar(
             select(func.count(File.id))
         )
-        result = await db_session.execute(
-            select(Publisher).order_by(Publisher.created_at.desc())
-        )
-        publishers = result.scalars().all()
+        page = await publishers_page(db_session)
+        publishers = page.rows
         
         if not all([email, password, traffic_source]):
             return await render_template('admin_dashboard.html', 
@@ -71,6 +91,7 @@ async def register_publisher():
                                           publishers=publishers,
                                           publisher_count=publisher_count,
                                           file_count=file_count,
+                                          next_cursor=page.next_cursor,
                                           error='All fields are required')
         
         try:
@@ -85,6 +106,7 @@ async def register_publisher():
                                               publishers=publishers,
                                               publisher_count=publisher_count,
                                               file_count=file_count,
+                                              next_cursor=page.next_cursor,
                                               error='Email already registered')
             
             password_hash = hash_password(password)
@@ -109,6 +131,7 @@ async def register_publisher():
                                           publishers=publishers,
                                           publisher_count=publisher_count,
                                           file_count=file_count,
+                                          next_cursor=page.next_cursor,
                                           error='Registration failed')
 
 @bp.route('/toggle-publisher/<int:publisher_id>', methods=['POST'])
@@ -135,22 +158,33 @@ async def toggle_publisher(publisher_id):
 @require_admin
 async def publishers():
     async with AsyncSessionLocal() as db_session:
-        result = await db_session.execute(
-            select(Publisher).order_by(Publisher.created_at.desc())
-        )
-        publishers = result.scalars().all()
-        
-        publisher_files = {}
-        for publisher in publishers:
-            file_count = await db_session.scalar(
-                select(func.count(File.id)).where(File.publisher_id == publisher.id)
-            )
-            publisher_files[publisher.id] = file_count
+        page = await publishers_with_file_counts(db_session)
         
     return await render_template('admin_publishers.html', 
                                   active_page='publishers',
-                                  publishers=publishers,
-                                  publisher_files=publisher_files)
+                                  next_cursor=page.next_cursor,
+                                  **_publisher_rows(page))
+
+@bp.route('/publishers/page')
+@require_admin
+async def publishers_list_page():
+    async with AsyncSessionLocal() as db_session:
+        try:
+            page = await publishers_with_file_counts(db_session, request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+        
+    return jsonify({
+        'status': 'success',
+        'html': await render_template('admin_publishers_rows.html', **_publisher_rows(page)),
+        'next_cursor': page.next_cursor
+    })
+
+def _publisher_rows(page) -> dict:
+    return {
+        'publishers': [publisher for publisher, _ in page.rows],
+        'publisher_files': {publisher.id: file_count for publisher, file_count in page.rows}
+    }
 
 @bp.route('/publisher/<int:publisher_id>/files')
 @require_admin
@@ -166,21 +200,64 @@ async def publisher_files(publisher_id):
         if not publisher:
             return redirect('/admin/publishers')
         
-        query = select(File).where(File.publisher_id == publisher_id)
-        
-        if search_hash:
-            query = query.where(File.access_code.ilike(f'%{search_hash}%'))
-        
-        query = query.order_by(File.created_at.desc())
-        result = await db_session.execute(query)
-        files = result.scalars().all()
+        page = await publisher_files_page(db_session, publisher_id, search=search_hash)
+        # Only the first page is loaded, so the total comes from the daily rollups
+        file_count = None if search_hash else await db_session.scalar(
+            select(func.coalesce(func.sum(PublisherDailyStats.files), 0))
+            .where(PublisherDailyStats.publisher_id == publisher_id)
+        )
         
     return await render_template('admin_publisher_files.html', 
                                   active_page='publishers',
                                   publisher=publisher,
-                                  files=files,
+                                  publisher_id=publisher_id,
+                                  files=page.rows,
+                                  file_count=file_count,
+                                  next_cursor=page.next_cursor,
+                                  page_url=f'/admin/publisher/{publisher_id}/files/page?{urlencode({"search": search_hash})}',
                                   search_hash=search_hash)
 
+@bp.route('/publisher/<int:publisher_id>/files/page')
+@require_admin
+async def publisher_files_list_page(publisher_id):
+    search_hash = request.args.get('search', '').strip()
+    
+    async with AsyncSessionLocal() as db_session:
+        try:
+            page = await publisher_files_page(db_session, publisher_id, request.args.get('cursor'), search=search_hash)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+        
+    return jsonify({
+        'status': 'success',
+        'html': await render_template('admin_publisher_files_rows.html', files=page.rows, publisher_id=publisher_id),
+        'next_cursor': page.next_cursor
+    })
+
+@bp.route('/files/search')
+@require_admin
+async def search_files_by_hash():
+    hash_id = request.args.get('hash_id', '').strip()
+    if len(hash_id) < MIN_HASH_SEARCH:
+        return jsonify({'status': 'error', 'message': f'hash_id must be at least {MIN_HASH_SEARCH} characters'}), 400
+    
+    async with AsyncSessionLocal() as db_session:
+        matches = await search_files(db_session, hash_id)
+        
+    return jsonify({
+        'status': 'success',
+        'files': [{
+            'id': file.id,
+            'hash_id': file.access_code,
+            'filename': file.filename,
+            'file_size': file.file_size,
+            'is_active': file.is_active,
+            'publisher_id': file.publisher_id,
+            'publisher_email': email,
+            'created_at': file.created_at.isoformat()
+        } for file, email in matches]
+    })
+
 @bp.route('/delete-file/<int:file_id>', methods=['POST'])
 @require_admin
 async def delete_file(file_id):
@@ -194,8 +271,10 @@ async def delete_file(file_id):
             file = result.scalar_one_or_none()
             
             if file:
+                await record_revocation(db_session, file)
                 await db_session.delete(file)
                 await db_session.commit()
+                file_revoked(file)
             
             if publisher_id:
                 return redirect(f'/admin/publisher/{publisher_id}/files')
@@ -239,7 +318,9 @@ async def add_ad_network():
             )
             
             db_session.add(network)
+            await publish(db_session, 'ad_networks')
             await db_session.commit()
+            ad_engine.invalidate()
             
             return redirect('/admin/ad-networks')
             
@@ -270,7 +351,9 @@ async def edit_ad_network(network_id):
                 network.status = data.get('status', 'active')
                 network.priority = int(data.get('priority') or 1)
                 
+                await publish(db_session, 'ad_networks')
                 await db_session.commit()
+                ad_engine.invalidate()
             
             return redirect('/admin/ad-networks')
             
@@ -290,7 +373,9 @@ async def toggle_ad_network(network_id):
             
             if network:
                 network.status = 'inactive' if network.status == 'active' else 'active'
+                await publish(db_session, 'ad_networks')
                 await db_session.commit()
+                ad_engine.invalidate()
             
             return redirect('/admin/ad-networks')
             
@@ -310,7 +395,9 @@ async def delete_ad_network(network_id):
             
             if network:
                 await db_session.delete(network)
+                await publish(db_session, 'ad_networks')
                 await db_session.commit()
+                ad_engine.invalidate()
             
             return redirect('/admin/ad-networks')
             
@@ -328,7 +415,9 @@ async def settings():
         if not settings:
             settings = Settings(terms_of_service='', privacy_policy='')
             db_session.add(settings)
+            await publish(db_session, 'settings')
             await db_session.commit()
+            settings_cache.invalidate()
         
     return await render_template('admin_settings.html', active_page='settings', settings=settings)
 
@@ -355,7 +444,9 @@ async def update_settings():
             settings.ads_api_token = data.get('ads_api_token', '').strip() or None
             settings.callback_mode = data.get('callback_mode', 'POST').strip()
             
+            await publish(db_session, 'settings')
             await db_session.commit()
+            settings_cache.invalidate()
             
             return redirect('/admin/settings')
             
@@ -369,53 +460,37 @@ async def withdrawals():
     status_filter = request.args.get('status', 'all')
     
     async with AsyncSessionLocal() as db_session:
-        # Base query
-        query = select(WithdrawalRequest).order_by(WithdrawalRequest.requested_at.desc())
-        
-        # Apply status filter
-        if status_filter != 'all':
-            query = query.where(WithdrawalRequest.status == status_filter)
-        
-        result = await db_session.execute(query)
-        withdrawal_requests = result.scalars().all()
-        
-        # Get publisher and bank account info for each request
-        withdrawal_data = []
-        for wr in withdrawal_requests:
-            publisher_result = await db_session.execute(
-                select(Publisher).where(Publisher.id == wr.publisher_id)
-            )
-            publisher = publisher_result.scalar_one_or_none()
-            
-            bank_result = await db_session.execute(
-                select(BankAccount).where(BankAccount.id == wr.bank_account_id)
-            )
-            bank_account = bank_result.scalar_one_or_none()
-            
-            withdrawal_data.append({
-                'withdrawal': wr,
-                'publisher': publisher,
-                'bank_account': bank_account
-            })
-        
-        # Get statistics
-        total_pending = await db_session.scalar(
-            select(func.count(WithdrawalRequest.id)).where(WithdrawalRequest.status == 'pending')
-        )
-        total_approved = await db_session.scalar(
-            select(func.count(WithdrawalRequest.id)).where(WithdrawalRequest.status == 'approved')
-        )
-        total_rejected = await db_session.scalar(
-            select(func.count(WithdrawalRequest.id)).where(WithdrawalRequest.status == 'rejected')
-        )
+        page = await withdrawals_with_accounts(db_session, None if status_filter == 'all' else status_filter)
+        status_counts = await withdrawal_status_counts(db_session)
         
     return await render_template('admin_withdrawals.html',
                                   active_page='withdrawals',
-                                  withdrawal_data=withdrawal_data,
+                                  withdrawal_data=page.rows,
+                                  next_cursor=page.next_cursor,
+                                  page_url=f'/admin/withdrawals/page?{urlencode({"status": status_filter})}',
                                   status_filter=status_filter,
-                                  total_pending=total_pending or 0,
-                                  total_approved=total_approved or 0,
-                                  total_rejected=total_rejected or 0)
+                                  total_pending=status_counts.get('pending', 0),
+                                  total_approved=status_counts.get('approved', 0),
+                                  total_rejected=status_counts.get('rejected', 0))
+
+@bp.route('/withdrawals/page')
+@require_admin
+async def withdrawals_page():
+    status_filter = request.args.get('status', 'all')
+    
+    async with AsyncSessionLocal() as db_session:
+        try:
+            page = await withdrawals_with_accounts(
+                db_session, None if status_filter == 'all' else status_filter, request.args.get('cursor')
+            )
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+        
+    return jsonify({
+        'status': 'success',
+        'html': await render_template('admin_withdrawals_rows.html', withdrawal_data=page.rows),
+        'next_cursor': page.next_cursor
+    })
 
 @bp.route('/withdrawal/approve/<int:withdrawal_id>', methods=['POST'])
 @require_admin
@@ -439,7 +514,8 @@ async def approve_withdrawal(withdrawal_id):
                 
                 if publisher and publisher.balance >= withdrawal.amount:
                     # Sufficient balance - approve withdrawal
-                    publisher.balance -= withdrawal.amount
+                    # Relative update, so concurrently settled impression earnings are not overwritten
+                    publisher.balance = Publisher.balance - withdrawal.amount
                     withdrawal.status = 'approved'
                     withdrawal.admin_note = admin_note
                     withdrawal.processed_at = datetime.now()
@@ -0,0 +1,56 @@
+from asyncio import Event
+from quart.asgi import ASGIHTTPConnection
+from quart.wrappers import Request
+from quart.wrappers.request import Body
+from bot.config import Server
+
+class BoundedBody(Body):
+    """Request body that stops reading from the socket while a streaming consumer is behind"""
+
+    def __init__(self, expected_content_length: int | None, max_content_length: int | None):
+        super().__init__(expected_content_length, max_content_length)
+        self._streaming = False
+        self._drained = Event()
+        self._drained.set()
+
+    def __aiter__(self) -> 'BoundedBody':
+        self._streaming = True
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return await super().__anext__()
+        finally:
+            self._drained.set()
+
+    def append(self, data: bytes):
+        super().append(data)
+        # Bodies that are awaited whole have to be buffered completely, so only
+        # iterated bodies apply backpressure
+        if self._streaming and len(self._data) >= Server.UPLOAD_BUFFER_SIZE:
+            self._drained.clear()
+
+    def set_complete(self):
+        super().set_complete()
+        self._drained.set()
+
+    async def wait_drained(self):
+        await self._drained.wait()
+
+class BoundedRequest(Request):
+    body_class = BoundedBody
+
+class BoundedHTTPConnection(ASGIHTTPConnection):
+    """Only asks the server for more body data once the handler has consumed the buffer"""
+
+    async def handle_messages(self, request: BoundedRequest, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.request':
+                request.body.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    request.body.set_complete()
+                else:
+                    await request.body.wait_drained()
+            elif message['type'] == 'http.disconnect':
+                return
@@ -1,66 +1,29 @@
 from quart import Blueprint, Response, request, render_template, redirect, jsonify
 from .error import abort
-from bot import TelegramBot
 from bot.config import Telegram, Server
-from math import ceil, floor
 from bot.modules.telegram import get_message, get_file_properties
+from bot.modules.streamer import CHUNK_SIZE, SEGMENTABLE_MIME_TYPES, ChunkUnavailable, fetch_chunk, hls_playlist, iter_chunks, segment_count
+from bot.modules.tokens import LinkTokens, token_index
+from bot.modules.signing import signed_links
+from bot.modules.access_log import access_log_writer
+from bot.modules.settings import settings_cache
+from bot.modules.outbox import callback_outbox
+from bot.modules.uploader import UploadError, upload_multipart, publish_upload
+from .uploads import respond_with_upload
 from bot.database import AsyncSessionLocal
-from bot.models import AccessLog, File, LinkTransaction, PublisherImpression, Settings, Publisher
-from sqlalchemy import select
+from bot.models import File, LinkTransaction, PublisherImpression
+from sqlalchemy import select, func
 from datetime import datetime, timedelta, timezone
 from secrets import token_hex
-import httpx
 import logging
-import os
 from pathlib import Path
-import tempfile
-from werkzeug.utils import secure_filename
 
 bp = Blueprint('main', __name__)
 logger = logging.getLogger('bot.server')
 
-async def send_links_to_api(android_id: str, stream_link: str, download_link: str, callback_url: str, callback_method: str = 'POST') -> tuple[bool, int, str]:
-    """Send generated links to external API using GET or POST method"""
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            if callback_method.upper() == 'GET':
-                params = {
-                    'android_id': android_id,
-                    'stream_link': stream_link,
-                    'download_link': download_link
-                }
-                response = await client.get(callback_url, params=params)
-            else:
-                payload = {
-                    'android_id': android_id,
-                    'stream_link': stream_link,
-                    'download_link': download_link
-                }
-                response = await client.post(callback_url, json=payload)
-            
-            success = 200 <= response.status_code < 300
-            if not success:
-                logger.warning(f"API callback ({callback_method}) failed with status {response.status_code}: {response.text}")
-            return success, response.status_code, response.text
-    except Exception as e:
-        logger.error(f"Error sending links to API via {callback_method}: {e}")
-        return False, 0, str(e)
-
-async def log_access_attempt(file_id: int, user_ip: str, user_agent: str, success: bool):
-    """Log file access attempt to database"""
-    async with AsyncSessionLocal() as session:
-        try:
-            access_log = AccessLog(
-                file_id=file_id,
-                user_ip=user_ip,
-                user_agent=user_agent or '',
-                success=success
-            )
-            session.add(access_log)
-            await session.commit()
-        except Exception as e:
-            await session.rollback()
-            print(f"Error logging access attempt: {e}")
+def log_access_attempt(file_id: int, user_ip: str, user_agent: str, success: bool):
+    """Queue a file access attempt for the batched access log writer"""
+    access_log_writer.log(file_id, user_ip, user_agent, success)
 
 @bp.route('/')
 async def home():
@@ -72,95 +35,11 @@ async def upload_page():
 
 @bp.route('/upload', methods=['POST'])
 async def handle_upload():
-    temp_file = None
     try:
-        files = await request.files
-        if 'video' not in files:
-            return jsonify({'status': 'error', 'message': 'No video file provided'}), 400
-        
-        video_file = files['video']
-        if not video_file.filename:
-            return jsonify({'status': 'error', 'message': 'No file selected'}), 400
-        
-        safe_filename = secure_filename(video_file.filename) or 'video_upload'
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'_{safe_filename}') as temp_file:
-            temp_path = temp_file.name
-        
-        try:
-            await video_file.save(temp_path)
-            
-            file_size = os.path.getsize(temp_path)
-            if file_size > 2 * 1024 * 1024 * 1024:
-                return jsonify({'status': 'error', 'message': 'File size exceeds 2 GB limit'}), 400
-            
-            secret_code = token_hex(Telegram.SECRET_CODE_LENGTH)
-            
-            sent_message = await TelegramBot.send_file(
-                entity=Telegram.CHANNEL_ID,
-                file=temp_path,
-                caption=f'`{secret_code}`'
-            )
-            if isinstance(sent_message, list):
-                sent_message = sent_message[0]
-            message_id = sent_message.id
-            
-            telegram_message = await get_message(message_id=message_id)
-            if not telegram_message:
-                logger.error(f"Could not retrieve message after upload: {message_id}")
-                return jsonify({'status': 'error', 'message': 'Failed to retrieve uploaded file'}), 500
-            
-            filename, file_size, mime_type = get_file_properties(telegram_message)
-            
-            video_duration = None
-            if hasattr(telegram_message, 'video') and telegram_message.video:
-                if hasattr(telegram_message.video, 'attributes'):
-                    for attr in telegram_message.video.attributes:
-                        if hasattr(attr, 'duration'):
-                            video_duration = attr.duration
-                            break
-            elif hasattr(telegram_message, 'document') and telegram_message.document:
-                if hasattr(telegram_message.document, 'attributes'):
-                    for attr in telegram_message.document.attributes:
-                        if hasattr(attr, 'duration'):
-                            video_duration = attr.duration
-                            break
-            
-            async with AsyncSessionLocal() as session:
-                try:
-                    file_record = File(
-                        telegram_message_id=message_id,
-                        filename=filename,
-                        file_size=file_size,
-                        mime_type=mime_type,
-                        access_code=secret_code,
-                        video_duration=int(video_duration) if video_duration else None
-                    )
-                    session.add(file_record)
-                    await session.commit()
-                except Exception as e:
-                    await session.rollback()
-                    logger.error(f"Error saving file to database: {e}")
-                    return jsonify({'status': 'error', 'message': 'Database error'}), 500
-            
-            logger.info(f"File uploaded via web: {filename}, hash_id: {secret_code}")
-            
-            play_link = f'{Server.BASE_URL}/play/{secret_code}'
-            
-            return jsonify({
-                'status': 'success',
-                'hash_id': secret_code,
-                'play_link': play_link,
-                'message': 'Video uploaded successfully'
-            }), 200
-            
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except Exception as e:
-                    logger.warning(f"Could not remove temp file: {e}")
-        
+        uploader = await upload_multipart(request.body, request.content_type, 'video')
+        return await respond_with_upload(None, lambda: publish_upload(uploader))
+    except UploadError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), e.status
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
@@ -230,15 +109,11 @@ async def postback_generate_links():
             if file_record.requested_by_android_id != android_id:
                 return jsonify({'status': 'error', 'message': 'Android ID does not match the request'}), 403
             
-            settings_result = await session.execute(select(Settings))
-            settings = settings_result.scalar_one_or_none()
+            settings = await settings_cache.get()
             
             default_callback_mode = settings.callback_mode if settings and settings.callback_mode else 'POST'
             final_callback_method = callback_method if callback_method else default_callback_mode
             
-            stream_token = token_hex(32)
-            download_token = token_hex(32)
-            
             if file_record.video_duration:
                 expiry_seconds = file_record.video_duration + 3600
             else:
@@ -246,29 +121,21 @@ async def postback_generate_links():
             
             expiry_time = datetime.now(timezone.utc) + timedelta(seconds=expiry_seconds)
             
-            file_record.temporary_stream_token = stream_token
-            file_record.temporary_download_token = download_token
+            if signed_links.enabled:
+                stream_token = signed_links.sign('stream', file_record.telegram_message_id, file_record.id, expiry_time, android_id)
+                download_token = signed_links.sign('download', file_record.telegram_message_id, file_record.id, expiry_time, android_id)
+            else:
+                stream_token = token_hex(32)
+                download_token = token_hex(32)
+                file_record.temporary_stream_token = stream_token
+                file_record.temporary_download_token = download_token
+            
             file_record.link_expiry_time = expiry_time
             
             stream_link = f'{Server.BASE_URL}/stream/{file_record.telegram_message_id}?token={stream_token}'
             download_link = f'{Server.BASE_URL}/dl/{file_record.telegram_message_id}?token={download_token}'
             
-            callback_status = None
-            callback_response = None
-            delivered = True
-            
-            if callback_url:
-                success, status_code, response_text = await send_links_to_api(
-                    android_id=android_id,
-                    stream_link=stream_link,
-                    download_link=download_link,
-                    callback_url=callback_url,
-                    callback_method=final_callback_method
-                )
-                callback_status = status_code
-                callback_response = response_text
-                delivered = success
-            
+            # The callback is delivered by the outbox worker, with retries, after the commit
             transaction = LinkTransaction(
                 file_id=file_record.telegram_message_id,
                 android_id=android_id,
@@ -277,13 +144,19 @@ async def postback_generate_links():
                 download_link=download_link,
                 callback_url=callback_url,
                 callback_method=final_callback_method if callback_url else None,
-                callback_status=callback_status,
-                callback_response=callback_response,
-                delivered=delivered
+                delivered=not callback_url,
+                attempts=0,
+                next_attempt_at=func.now() if callback_url else None
             )
             session.add(transaction)
+            if not signed_links.enabled:
+                await token_index.share(session, file_record)
             
             await session.commit()
+            if not signed_links.enabled:
+                token_index.remember(file_record)
+            if callback_url:
+                callback_outbox.wake()
             
             logger.info(f"Links generated for android_id: {android_id}, hash_id: {hash_id}, callback: {callback_url}, method: {final_callback_method if callback_url else 'N/A'}")
             
@@ -292,11 +165,8 @@ async def postback_generate_links():
                 'message': 'Links generated successfully. Use /api/links endpoint to retrieve them.'
             }
             
-            if callback_url and delivered:
-                response_data['callback_delivered'] = True
-            elif callback_url and not delivered:
-                response_data['callback_delivered'] = False
-                response_data['callback_error'] = callback_response
+            if callback_url:
+                response_data['callback_queued'] = True
             
             return jsonify(response_data), 200
             
@@ -329,14 +199,27 @@ async def get_links_by_android_id():
         if file_record.requested_by_android_id != android_id:
             return jsonify({'status': 'error', 'message': 'Android ID does not match'}), 403
         
-        if not file_record.temporary_stream_token or not file_record.temporary_download_token:
+        if signed_links.enabled:
+            links_generated = bool(file_record.link_expiry_time)
+        else:
+            links_generated = bool(file_record.temporary_stream_token and file_record.temporary_download_token)
+        
+        if not links_generated:
             return jsonify({'status': 'error', 'message': 'No links have been generated yet. Call /api/postback first.'}), 404
         
         if not file_record.link_expiry_time or datetime.now(timezone.utc) > file_record.link_expiry_time:
             return jsonify({'status': 'error', 'message': 'Links have expired'}), 403
         
-        stream_link = f'{Server.BASE_URL}/stream/{file_record.telegram_message_id}?token={file_record.temporary_stream_token}'
-        download_link = f'{Server.BASE_URL}/dl/{file_record.telegram_message_id}?token={file_record.temporary_download_token}'
+        if signed_links.enabled:
+            # Signing is deterministic, so this rebuilds the links /api/postback handed out
+            stream_token = signed_links.sign('stream', file_record.telegram_message_id, file_record.id, file_record.link_expiry_time, android_id)
+            download_token = signed_links.sign('download', file_record.telegram_message_id, file_record.id, file_record.link_expiry_time, android_id)
+        else:
+            stream_token = file_record.temporary_stream_token
+            download_token = file_record.temporary_download_token
+        
+        stream_link = f'{Server.BASE_URL}/stream/{file_record.telegram_message_id}?token={stream_token}'
+        download_link = f'{Server.BASE_URL}/dl/{file_record.telegram_message_id}?token={download_token}'
         
         return jsonify({
             'status': 'success',
@@ -379,26 +262,20 @@ async def tracking_postback():
                     'message': 'No publisher associated with this video'
                 }), 400
             
+            settings = await settings_cache.get()
+            impression_rate = settings.impression_rate if settings else 0.0
+            
+            # Append-only; the balance is credited later by the impression settler
             impression = PublisherImpression(
                 publisher_id=file_record.publisher_id,
                 hash_id=hash_id,
                 android_id=android_id,
-                user_ip=user_ip
+                user_ip=user_ip,
+                earning=impression_rate,
+                settled=False
             )
             session.add(impression)
             
-            settings_result = await session.execute(select(Settings))
-            settings = settings_result.scalar_one_or_none()
-            impression_rate = settings.impression_rate if settings else 0.0
-            
-            publisher_result = await session.execute(
-                select(Publisher).where(Publisher.id == file_record.publisher_id)
-            )
-            publisher = publisher_result.scalar_one_or_none()
-            
-            if publisher:
-                publisher.balance += impression_rate
-            
             await session.commit()
             
             logger.info(f"Impression tracked for publisher {file_record.publisher_id}, hash_id: {hash_id}, android_id: {android_id}, earned: ${impression_rate}")
@@ -423,43 +300,38 @@ async def transmit_file(file_id):
     user_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
     user_agent = request.headers.get('User-Agent')
     
-    file = await get_message(message_id=int(file_id))
-    if not file:
-        await log_access_attempt(file_id, user_ip or '', user_agent or '', False)
-        abort(404)
-    
     token = request.args.get('token')
     
     if not token:
-        await log_access_attempt(file_id, user_ip or '', user_agent or '', False)
+        log_access_attempt(file_id, user_ip or '', user_agent or '', False)
         abort(401, 'Token is required')
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(File).where(File.telegram_message_id == file_id)
-        )
-        file_record = result.scalar_one_or_none()
-        
-        if not file_record:
-            await log_access_attempt(file_id, user_ip or '', user_agent or '', False)
-            abort(404)
-        
-        if file_record.temporary_download_token != token:
-            await log_access_attempt(file_id, user_ip or '', user_agent or '', False)
-            abort(403)
-        
-        if not file_record.link_expiry_time or datetime.now(timezone.utc) > file_record.link_expiry_time:
-            await log_access_attempt(file_id, user_ip or '', user_agent or '', False)
-            abort(403, 'Link has expired')
-        
-        if not file_record.is_active:
-            await log_access_attempt(file_id, user_ip or '', user_agent or '', False)
-            abort(403, 'File has been revoked')
+    if signed_links.is_signed(token):
+        link = signed_links.verify('download', file_id, token)
+    else:
+        link = await token_index.resolve('download', token)
+    
+    if not link or link.message_id != file_id:
+        log_access_attempt(file_id, user_ip or '', user_agent or '', False)
+        abort(403)
+    
+    if link.expired:
+        log_access_attempt(file_id, user_ip or '', user_agent or '', False)
+        abort(403, 'Link has expired')
+    
+    if not link.is_active:
+        log_access_attempt(file_id, user_ip or '', user_agent or '', False)
+        abort(403, 'File has been revoked')
+    
+    file = await get_message(message_id=int(file_id))
+    if not file:
+        log_access_attempt(file_id, user_ip or '', user_agent or '', False)
+        abort(404)
         
     range_header = request.headers.get('Range')
     
     # Log successful access attempt
-    await log_access_attempt(file_id, user_ip or '', user_agent or '', True)
+    log_access_attempt(file_id, user_ip or '', user_agent or '', True)
 
     file_name, file_size, mime_type = get_file_properties(file)
     
@@ -474,7 +346,7 @@ async def transmit_file(file_id):
     if (until_bytes > file_size) or (from_bytes < 0) or (until_bytes < from_bytes):
         abort(416, 'Invalid range.')
 
-    chunk_size = 1024 * 1024
+    chunk_size = CHUNK_SIZE
     until_bytes = min(until_bytes, file_size - 1)
 
     offset = from_bytes - (from_bytes % chunk_size)
@@ -482,7 +354,8 @@ async def transmit_file(file_id):
     last_part_cut = until_bytes % chunk_size + 1
 
     req_length = until_bytes - from_bytes + 1
-    part_count = ceil(until_bytes / chunk_size) - floor(offset / chunk_size)
+    first_part = offset // chunk_size
+    part_count = until_bytes // chunk_size - first_part + 1
     
     headers = {
             "Content-Type": f"{mime_type}",
@@ -494,11 +367,8 @@ async def transmit_file(file_id):
 
     async def file_generator():
         current_part = 1
-        # Type hint to help LSP understand that file is valid for iter_download
-        async for chunk in TelegramBot.iter_download(file, offset=offset, chunk_size=chunk_size, stride=chunk_size, file_size=file_size):  # type: ignore
-            if not chunk:
-                break
-            elif part_count == 1:
+        async for chunk in iter_chunks(file, first_part, part_count, file_size):
+            if part_count == 1:
                 yield chunk[first_part_cut:last_part_cut]
             elif current_part == 1:
                 yield chunk[first_part_cut:]
@@ -509,39 +379,101 @@ async def transmit_file(file_id):
 
             current_part += 1
 
-            if current_part > part_count:
-                break
-
     return Response(file_generator(), headers=headers, status=206 if range_header else 200)
 
-@bp.route('/stream/<int:file_id>')
-async def stream_file(file_id):
+async def authorize_stream(file_id: int) -> LinkTokens:
+    """Check the stream token of the current request, aborting unless it grants access to the file"""
     token = request.args.get('token')
     
     if not token:
         abort(401, 'Token is required')
     
+    if signed_links.is_signed(token):
+        link = signed_links.verify('stream', file_id, token)
+    else:
+        link = await token_index.resolve('stream', token)
+    
+    if not link or link.message_id != file_id:
+        abort(403)
+    
+    if link.expired:
+        abort(403, 'Link has expired')
+    
+    if not link.is_active:
+        abort(403, 'File has been revoked')
+    
+    return link
+
+@bp.route('/stream/<int:file_id>')
+async def stream_file(file_id):
+    link = await authorize_stream(file_id)
+    
+    # Containers that can be cut at chunk boundaries are played from fixed, cacheable segment URLs
+    playlist_link = ''
+    file = await get_message(message_id=file_id)
+    if file and get_file_properties(file)[2] in SEGMENTABLE_MIME_TYPES:
+        playlist_link = f'{Server.BASE_URL}/hls/{file_id}.m3u8?token={link.stream_token}'
+    
+    return await render_template(
+        'player.html',
+        mediaLink=f'{Server.BASE_URL}/dl/{file_id}?token={link.download_token}',
+        playlistLink=playlist_link
+    )
+
+@bp.route('/hls/<int:file_id>.m3u8')
+async def stream_playlist(file_id):
+    link = await authorize_stream(file_id)
+    
+    file = await get_message(message_id=file_id)
+    if not file:
+        abort(404)
+    
+    _, file_size, mime_type = get_file_properties(file)
+    if mime_type not in SEGMENTABLE_MIME_TYPES or not file_size:
+        abort(404, 'Segmented streaming is not available for this file')
+    
     async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(File).where(File.telegram_message_id == file_id)
-        )
-        file_record = result.scalar_one_or_none()
-        
-        if not file_record:
-            abort(404)
-        
-        if file_record.temporary_stream_token != token:
-            abort(403)
-        
-        if not file_record.link_expiry_time or datetime.now(timezone.utc) > file_record.link_expiry_time:
-            abort(403, 'Link has expired')
-        
-        if not file_record.is_active:
-            abort(403, 'File has been revoked')
-        
-        download_token = file_record.temporary_download_token
+        result = await session.execute(select(File.video_duration).where(File.id == link.file_id))
+        duration = result.scalar_one_or_none() or file.file.duration
+    
+    if not duration:
+        abort(404, 'Segmented streaming is not available for this file')
+    
+    playlist = hls_playlist(
+        file_size,
+        duration,
+        lambda index: f'{Server.BASE_URL}/segment/{file_id}/{index}?token={link.stream_token}'
+    )
+    return Response(playlist, mimetype='application/vnd.apple.mpegurl', headers={'Cache-Control': 'no-cache'})
+
+@bp.route('/segment/<int:file_id>/<int:index>')
+async def stream_segment(file_id, index):
+    link = await authorize_stream(file_id)
+    
+    file = await get_message(message_id=file_id)
+    if not file:
+        abort(404)
+    
+    _, file_size, mime_type = get_file_properties(file)
+    if index >= segment_count(file_size):
+        abort(404)
+    
+    # A segment never changes, so browsers may keep it for as long as the link is valid
+    max_age = max(int((link.expiry - datetime.now(timezone.utc)).total_seconds()), 0)
+    headers = {
+        'Cache-Control': f'private, max-age={max_age}, immutable',
+        'ETag': f'"{file_id}-{index}"'
+    }
     
-    return await render_template('player.html', mediaLink=f'{Server.BASE_URL}/dl/{file_id}?token={download_token}')
+    if headers['ETag'] in request.headers.get('If-None-Match', ''):
+        return Response('', status=304, headers=headers)
+    
+    try:
+        chunk = await fetch_chunk(file, index, file_size)
+    except ChunkUnavailable:
+        abort(503, 'File is temporarily unavailable.')
+    
+    return Response(bytes(chunk), mimetype=mime_type, headers=headers)
 
 @bp.route('/play/<hash_id>')
 async def play_video(hash_id):
@@ -557,8 +489,7 @@ async def play_video(hash_id):
         if not file_record.is_active:
             abort(403, 'This video has been removed')
         
-        settings_result = await session.execute(select(Settings))
-        settings = settings_result.scalar_one_or_none()
+        settings = await settings_cache.get()
         
         package_name = settings.android_package_name if settings and settings.android_package_name else ''
         deep_link_scheme = settings.android_deep_link_scheme if settings and settings.android_deep_link_scheme else ''
@@ -571,20 +502,14 @@ async def play_video(hash_id):
 
 @bp.route('/terms-of-service')
 async def terms_of_service():
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(Settings))
-        settings = result.scalar_one_or_none()
-        
-        terms = settings.terms_of_service if settings else 'Terms of Service not available.'
+    settings = await settings_cache.get()
+    terms = settings.terms_of_service if settings else 'Terms of Service not available.'
     
     return await render_template('terms.html', content=terms, title='Terms of Service')
 
 @bp.route('/privacy-policy')
 async def privacy_policy():
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(Settings))
-        settings = result.scalar_one_or_none()
-        
-        privacy = settings.privacy_policy if settings else 'Privacy Policy not available.'
+    settings = await settings_cache.get()
+    privacy = settings.privacy_policy if settings else 'Privacy Policy not available.'
     
     return await render_template('privacy.html', content=privacy, title='Privacy Policy')
\ No newline at end of file
@@ -1,15 +1,16 @@
 from quart import Blueprint, request, render_template, redirect, session, jsonify
 from bot.database import AsyncSessionLocal
-from bot.models import File, Publisher, PublisherImpression, Settings, BankAccount, WithdrawalRequest
-from bot import TelegramBot
+from bot.models import File, Publisher, PublisherDailyStats, BankAccount, WithdrawalRequest
 from bot.config import Telegram, Server
-from bot.modules.telegram import get_message, get_file_properties
+from bot.modules.revocation import record_revocation, file_revoked
+from bot.modules.settings import settings_cache
+from bot.modules.uploader import UploadError, upload_multipart, publish_upload
+from bot.modules.queries import publisher_files_page
+from .uploads import respond_with_upload
 from sqlalchemy import select, and_, func
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from secrets import token_hex
-import os
-import tempfile
-from werkzeug.utils import secure_filename
+from urllib.parse import urlencode
 import logging
 
 bp = Blueprint('publisher', __name__, url_prefix='/publisher')
@@ -45,90 +46,38 @@ async def dashboard():
         )
         publisher = result.scalar_one_or_none()
         
-        # Get total files count
-        total_files_result = await db_session.execute(
-            select(func.count(File.id)).where(File.publisher_id == session['publisher_id'])
-        )
-        total_files = total_files_result.scalar() or 0
-        
-        # Get today's files count
-        today_files_result = await db_session.execute(
-            select(func.count(File.id)).where(
-                and_(
-                    File.publisher_id == session['publisher_id'],
-                    func.date(File.created_at) == today
-                )
-            )
-        )
-        today_files = today_files_result.scalar() or 0
-        
-        # Get total impressions count
-        total_impressions_result = await db_session.execute(
-            select(func.count(PublisherImpression.id)).where(
-                PublisherImpression.publisher_id == session['publisher_id']
-            )
-        )
-        total_impressions = total_impressions_result.scalar() or 0
-        
-        # Get today's impressions count
-        today_impressions_result = await db_session.execute(
-            select(func.count(PublisherImpression.id)).where(
-                and_(
-                    PublisherImpression.publisher_id == session['publisher_id'],
-                    PublisherImpression.impression_date == today
-                )
-            )
-        )
-        today_impressions = today_impressions_result.scalar() or 0
-        
-        # Get last 7 days data for graph
-        # File uploads by day
-        files_result = await db_session.execute(
+        # Daily rollups: one row per active day, however many files and impressions there are
+        totals_result = await db_session.execute(
             select(
-                func.date(File.created_at).label('date'),
-                func.count(File.id).label('count')
-            ).where(
-                File.publisher_id == session['publisher_id']
-            ).group_by(
-                func.date(File.created_at)
-            ).order_by(
-                func.date(File.created_at).desc()
-            ).limit(30)
+                func.coalesce(func.sum(PublisherDailyStats.files), 0),
+                func.coalesce(func.sum(PublisherDailyStats.impressions), 0),
+                func.coalesce(func.sum(PublisherDailyStats.earnings), 0.0)
+            ).where(PublisherDailyStats.publisher_id == session['publisher_id'])
         )
-        files_by_date = {str(row.date): row.count for row in files_result.all()}
+        total_files, total_impressions, total_earnings = totals_result.one()
         
-        # Impressions by day
-        impressions_result = await db_session.execute(
-            select(
-                PublisherImpression.impression_date,
-                func.count(PublisherImpression.id).label('count')
-            ).where(
-                PublisherImpression.publisher_id == session['publisher_id']
-            ).group_by(
-                PublisherImpression.impression_date
-            ).order_by(
-                PublisherImpression.impression_date.desc()
-            ).limit(30)
+        dates = [today - timedelta(days=i) for i in range(29, -1, -1)]
+        daily_result = await db_session.execute(
+            select(PublisherDailyStats).where(
+                PublisherDailyStats.publisher_id == session['publisher_id'],
+                PublisherDailyStats.stat_date >= dates[0]
+            )
         )
-        impressions_by_date = {str(row.impression_date): row.count for row in impressions_result.all()}
+        daily = {row.stat_date: row for row in daily_result.scalars()}
         
         # Get impression rate from settings
-        settings_result = await db_session.execute(select(Settings))
-        settings = settings_result.scalar_one_or_none()
+        settings = await settings_cache.get()
         impression_rate = settings.impression_rate if settings else 0.0
         
-        # Calculate earnings
-        today_earnings = today_impressions * impression_rate
-        total_earnings = total_impressions * impression_rate
+        today_stats = daily.get(today)
+        today_files = today_stats.files if today_stats else 0
+        today_impressions = today_stats.impressions if today_stats else 0
+        today_earnings = today_stats.earnings if today_stats else 0.0
         
-        # Create combined date list for last 30 days
-        from datetime import timedelta
-        dates = [(today - timedelta(days=i)).isoformat() for i in range(29, -1, -1)]
-        
-        chart_labels = dates
-        chart_files_data = [files_by_date.get(d, 0) for d in dates]
-        chart_impressions_data = [impressions_by_date.get(d, 0) for d in dates]
-        chart_earnings_data = [float(impressions_by_date.get(d, 0)) * impression_rate for d in dates]
+        chart_labels = [d.isoformat() for d in dates]
+        chart_files_data = [daily[d].files if d in daily else 0 for d in dates]
+        chart_impressions_data = [daily[d].impressions if d in daily else 0 for d in dates]
+        chart_earnings_data = [daily[d].earnings if d in daily else 0.0 for d in dates]
         
     return await render_template('publisher_dashboard.html', 
                                   active_page='dashboard',
@@ -201,155 +150,93 @@ async def generate_api_key():
 @bp.route('/upload-video', methods=['POST'])
 @require_publisher
 async def upload_video():
-    temp_file = None
     try:
-        files = await request.files
-        if 'video' not in files:
-            return jsonify({'status': 'error', 'message': 'No video file provided'}), 400
-        
-        video_file = files['video']
-        if not video_file.filename:
-            return jsonify({'status': 'error', 'message': 'No file selected'}), 400
-        
-        safe_filename = secure_filename(video_file.filename) or 'video_upload'
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'_{safe_filename}') as temp_file:
-            temp_path = temp_file.name
-        
-        try:
-            await video_file.save(temp_path)
-            
-            file_size = os.path.getsize(temp_path)
-            if file_size > 2 * 1024 * 1024 * 1024:
-                return jsonify({'status': 'error', 'message': 'File size exceeds 2 GB limit'}), 400
-            
-            secret_code = token_hex(Telegram.SECRET_CODE_LENGTH)
-            
-            sent_message = await TelegramBot.send_file(
-                entity=Telegram.CHANNEL_ID,
-                file=temp_path,
-                caption=f'`{secret_code}`'
-            )
-            if isinstance(sent_message, list):
-                sent_message = sent_message[0]
-            message_id = sent_message.id
-            
-            telegram_message = await get_message(message_id=message_id)
-            if not telegram_message:
-                logger.error(f"Could not retrieve message after upload: {message_id}")
-                return jsonify({'status': 'error', 'message': 'Failed to retrieve uploaded file'}), 500
-            
-            filename, file_size, mime_type = get_file_properties(telegram_message)
-            
-            video_duration = None
-            if hasattr(telegram_message, 'video') and telegram_message.video:
-                if hasattr(telegram_message.video, 'attributes'):
-                    for attr in telegram_message.video.attributes:
-                        duration = getattr(attr, 'duration', None)
-                        if duration:
-                            video_duration = duration
-                            break
-            elif hasattr(telegram_message, 'document') and telegram_message.document:
-                if hasattr(telegram_message.document, 'attributes'):
-                    for attr in telegram_message.document.attributes:
-                        duration = getattr(attr, 'duration', None)
-                        if duration:
-                            video_duration = duration
-                            break
-            
-            async with AsyncSessionLocal() as db_session:
-                try:
-                    file_record = File(
-                        telegram_message_id=message_id,
-                        filename=filename,
-                        file_size=file_size,
-                        mime_type=mime_type,
-                        access_code=secret_code,
-                        video_duration=int(video_duration) if video_duration else None,
-                        publisher_id=session.get('publisher_id')
-                    )
-                    db_session.add(file_record)
-                    await db_session.commit()
-                except Exception as e:
-                    await db_session.rollback()
-                    logger.error(f"Error saving file to database: {e}")
-                    return jsonify({'status': 'error', 'message': 'Database error'}), 500
-            
-            logger.info(f"File uploaded by publisher {session['publisher_email']}: {filename}, hash_id: {secret_code}")
-            
-            play_link = f'{Server.BASE_URL}/play/{secret_code}'
-            
-            return jsonify({
-                'status': 'success',
-                'hash_id': secret_code,
-                'play_link': play_link,
-                'filename': filename,
-                'message': 'Video uploaded successfully'
-            }), 200
-            
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except Exception as e:
-                    logger.warning(f"Could not remove temp file: {e}")
-        
+        uploader = await upload_multipart(request.body, request.content_type, 'video')
+        publisher_id = session.get('publisher_id')
+        return await respond_with_upload(publisher_id, lambda: publish_upload(uploader, publisher_id=publisher_id))
+    except UploadError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), e.status
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
 
+def _video_filters() -> tuple[datetime | None, datetime | None]:
+    """The created_at bounds picked with from_date and to_date, ignoring malformed dates"""
+    created_from = created_to = None
+    
+    try:
+        created_from = datetime.strptime(request.args.get('from_date', ''), '%Y-%m-%d')
+    except ValueError:
+        pass
+    
+    try:
+        created_to = datetime.strptime(request.args.get('to_date', ''), '%Y-%m-%d')
+        created_to = created_to.replace(hour=23, minute=59, second=59)
+    except ValueError:
+        pass
+    
+    return created_from, created_to
+
 @bp.route('/videos')
 @require_publisher
 async def videos():
     from_date = request.args.get('from_date', '')
     to_date = request.args.get('to_date', '')
+    created_from, created_to = _video_filters()
     
     async with AsyncSessionLocal() as db_session:
-        result = await db_session.execute(
-            select(Publisher).where(Publisher.id == session['publisher_id'])
+        page = await publisher_files_page(
+            db_session, session['publisher_id'], created_from=created_from, created_to=created_to
         )
-        publisher = result.scalar_one_or_none()
-        
-        query = select(File).where(File.publisher_id == session['publisher_id'])
-        
-        if from_date:
-            try:
-                from_datetime = datetime.strptime(from_date, '%Y-%m-%d')
-                query = query.where(File.created_at >= from_datetime)
-            except ValueError:
-                pass
-        
-        if to_date:
-            try:
-                to_datetime = datetime.strptime(to_date, '%Y-%m-%d')
-                to_datetime = to_datetime.replace(hour=23, minute=59, second=59)
-                query = query.where(File.created_at <= to_datetime)
-            except ValueError:
-                pass
         
-        result = await db_session.execute(query.order_by(File.created_at.desc()))
-        files = result.scalars().all()
-        
-        total_files = len(files)
-        
-        date_counts = {}
-        for file in files:
-            file_date = file.created_at.date().isoformat()
-            date_counts[file_date] = date_counts.get(file_date, 0) + 1
+        # Counted from the daily rollups so the chart never loads the files themselves
+        query = select(PublisherDailyStats.stat_date, PublisherDailyStats.files).where(
+            PublisherDailyStats.publisher_id == session['publisher_id'],
+            PublisherDailyStats.files > 0
+        )
+        if created_from:
+            query = query.where(PublisherDailyStats.stat_date >= created_from.date())
+        if created_to:
+            query = query.where(PublisherDailyStats.stat_date <= created_to.date())
         
-        chart_labels = sorted(date_counts.keys())
-        chart_data = [date_counts[label] for label in chart_labels]
+        result = await db_session.execute(query.order_by(PublisherDailyStats.stat_date))
+        date_counts = result.all()
         
+    chart_labels = [stat_date.isoformat() for stat_date, _ in date_counts]
+    chart_data = [files for _, files in date_counts]
+    
     return await render_template('publisher_videos.html', 
                                   active_page='videos',
                                   email=session['publisher_email'],
-                                  files=files,
-                                  total_files=total_files,
+                                  files=page.rows,
+                                  next_cursor=page.next_cursor,
+                                  page_url=f'/publisher/videos/page?{urlencode({"from_date": from_date, "to_date": to_date})}',
+                                  total_files=sum(chart_data),
                                   from_date=from_date,
                                   to_date=to_date,
                                   chart_labels=chart_labels,
                                   chart_data=chart_data)
 
+@bp.route('/videos/page')
+@require_publisher
+async def videos_page():
+    created_from, created_to = _video_filters()
+    
+    async with AsyncSessionLocal() as db_session:
+        try:
+            page = await publisher_files_page(
+                db_session, session['publisher_id'], request.args.get('cursor'), 
+                created_from=created_from, created_to=created_to
+            )
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+        
+    return jsonify({
+        'status': 'success',
+        'html': await render_template('publisher_videos_rows.html', files=page.rows),
+        'next_cursor': page.next_cursor
+    })
+
 @bp.route('/delete-video/<int:file_id>', methods=['POST'])
 @require_publisher
 async def delete_video(file_id):
@@ -368,8 +255,10 @@ async def delete_video(file_id):
             if not file:
                 return jsonify({'status': 'error', 'message': 'File not found or unauthorized'}), 404
             
+            await record_revocation(db_session, file)
             await db_session.delete(file)
             await db_session.commit()
+            file_revoked(file)
             
             logger.info(f"File deleted by publisher {session['publisher_email']}: {file.filename}, hash_id: {file.access_code}")
             
@@ -405,8 +294,7 @@ async def withdraw():
         )
         withdrawals = withdrawals_result.scalars().all()
         
-        settings_result = await db_session.execute(select(Settings))
-        settings = settings_result.scalar_one_or_none()
+        settings = await settings_cache.get()
         minimum_withdrawal = settings.minimum_withdrawal if settings else 10.0
         
     return await render_template('publisher_withdraw.html',
@@ -490,8 +378,7 @@ async def request_withdrawal():
             if not bank_account:
                 return redirect('/publisher/withdraw?message=Please add bank account first')
             
-            settings_result = await db_session.execute(select(Settings))
-            settings = settings_result.scalar_one_or_none()
+            settings = await settings_cache.get()
             minimum_withdrawal = settings.minimum_withdrawal if settings else 10.0
             
             if not publisher:
@@ -503,7 +390,8 @@ async def request_withdrawal():
             if amount > publisher.balance:
                 return redirect('/publisher/withdraw?message=Insufficient balance')
             
-            publisher.balance -= amount
+            # Relative update, so concurrently settled impression earnings are not overwritten
+            publisher.balance = Publisher.balance - amount
             
             withdrawal = WithdrawalRequest(
                 publisher_id=session['publisher_id'],
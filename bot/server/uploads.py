@@ -0,0 +1,175 @@
+from quart import Blueprint, Response, request, session, jsonify
+from asyncio import wait_for
+from bot.config import Server
+from bot.models import File
+from bot.modules.affinity import owning_worker
+from bot.modules.http import http_client
+from bot.modules.jobs import upload_queue
+from bot.modules.resumable import upload_sessions
+from bot.modules.uploader import UploadError, upload_result
+from functools import wraps
+from typing import Awaitable, Callable
+import json
+from werkzeug.utils import secure_filename
+import logging
+
+bp = Blueprint('uploads', __name__, url_prefix='/uploads')
+logger = logging.getLogger('bot.server')
+
+def wants_job() -> bool:
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+async def respond_with_upload(publisher_id: int | None, publish: Callable[[], Awaitable[File]]):
+    """Publish the upload now, or with ?async=1 queue it and answer with a job to poll"""
+    source = f"by publisher {session.get('publisher_email')}" if publisher_id else 'via web'
+
+    async def work() -> dict:
+        file_record = await publish()
+        logger.info(f"File uploaded {source}: {file_record.filename}, hash_id: {file_record.access_code}")
+        return upload_result(file_record)
+
+    if wants_job():
+        job = upload_queue.submit(publisher_id, work)
+        return jsonify({'status': 'success', 'status_url': f'/uploads/jobs/{job.id}', **upload_queue.status(job)}), 202
+
+    return jsonify(await work()), 200
+
+# Hop-by-hop headers are not relayed between worker processes
+HOP_HEADERS = {'host', 'connection', 'keep-alive', 'transfer-encoding', 'te', 'upgrade'}
+
+async def forward_to_worker(index: int):
+    """Replay the current request against the sibling worker process and relay its response"""
+    url = f'http://127.0.0.1:{Server.WORKER_PORT + index}{request.path}'
+    if request.query_string:
+        url += f'?{request.query_string.decode()}'
+
+    upstream = await http_client().send(
+        http_client().build_request(
+            request.method,
+            url,
+            headers=[(k, v) for k, v in request.headers.items() if k.lower() not in HOP_HEADERS],
+            # Chunks are streamed through rather than read into memory first
+            content=request.body,
+            # Finalizing and event streams run for as long as the upload takes
+            timeout=None
+        ),
+        stream=True
+    )
+
+    async def relay():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    headers = [(k, v) for k, v in upstream.headers.multi_items() if k.lower() not in HOP_HEADERS]
+    return Response(relay(), status=upstream.status_code, headers=headers)
+
+def on_owning_worker(func):
+    """Hand requests for an upload or job held by another web worker over to that worker"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        index = owning_worker(kwargs.get('upload_id') or kwargs.get('job_id') or '')
+        if index is not None:
+            return await forward_to_worker(index)
+        return await func(*args, **kwargs)
+    return wrapper
+
+def with_upload(func):
+    """Resolve <upload_id> to a session owned by the current visitor"""
+    @wraps(func)
+    async def wrapper(upload_id, *args, **kwargs):
+        upload = upload_sessions.get(upload_id, session.get('publisher_id'))
+        if not upload:
+            return jsonify({'status': 'error', 'message': 'Upload not found or expired'}), 404
+
+        try:
+            return await func(upload, *args, **kwargs)
+        except UploadError as e:
+            return jsonify({'status': 'error', 'message': str(e), **upload.status()}), e.status
+    return wrapper
+
+@bp.route('', methods=['POST'])
+async def create_upload():
+    data = await request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename') or '')) or 'video_upload'
+
+    try:
+        size = int(data.get('size') or 0)
+        upload = upload_sessions.create(filename, size, session.get('publisher_id'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'size must be an integer'}), 400
+    except UploadError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), e.status
+
+    return jsonify({'status': 'success', **upload.status()}), 201
+
+@bp.route('/<upload_id>', methods=['GET'])
+@on_owning_worker
+@with_upload
+async def upload_status(upload):
+    return jsonify({'status': 'success', **upload.status()}), 200
+
+@bp.route('/<upload_id>', methods=['PATCH'])
+@on_owning_worker
+@with_upload
+async def append_upload(upload):
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Upload-Offset header is required'}), 400
+
+    await upload_sessions.append(upload, offset, request.body)
+    return jsonify({'status': 'success', **upload.status()}), 200
+
+@bp.route('/<upload_id>/finalize', methods=['POST'])
+@on_owning_worker
+@with_upload
+async def finalize_upload(upload):
+    upload_sessions.claim(upload)
+
+    try:
+        return await respond_with_upload(upload.publisher_id, lambda: upload_sessions.finalize(upload))
+    except UploadError:
+        raise
+    except Exception as e:
+        logger.error(f"Upload error: {e}")
+        return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@on_owning_worker
+async def job_status(job_id):
+    job = upload_queue.get(job_id, session.get('publisher_id'))
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Job not found or expired'}), 404
+
+    return jsonify({'status': 'success', **upload_queue.status(job)}), 200
+
+@bp.route('/jobs/<job_id>/events', methods=['GET'])
+@on_owning_worker
+async def job_events(job_id):
+    job = upload_queue.get(job_id, session.get('publisher_id'))
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Job not found or expired'}), 404
+
+    async def events():
+        while True:
+            changed = job.changed
+            yield f'data: {json.dumps(upload_queue.status(job))}\n\n'
+            if job.finished:
+                return
+            # Wakes up on every state change, and periodically to refresh the queue position
+            try:
+                await wait_for(changed.wait(), 5)
+            except TimeoutError:
+                pass
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@bp.route('/<upload_id>', methods=['DELETE'])
+@on_owning_worker
+@with_upload
+async def cancel_upload(upload):
+    upload_sessions.discard(upload)
+    return jsonify({'status': 'success', 'message': 'Upload cancelled'}), 200
@@ -0,0 +1,111 @@
+from asyncio import Task, CancelledError, create_task, get_running_loop, sleep, to_thread
+from logging import getLogger
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from os import environ
+from secrets import token_hex
+from signal import SIGTERM
+from socket import socket
+from uvicorn import Config
+from bot import TelegramBot
+from bot.config import Telegram, Server
+from bot.database import init_db, close_db
+from bot.modules.jobs import upload_queue
+from bot.modules.notify import listener
+from bot.server import instance, server
+
+logger = getLogger('bot.workers')
+
+def serve_worker(sockets: list[socket]):
+    """Entry point of a web worker process: its own Telegram session, the web app on the inherited sockets"""
+    TelegramBot.start(bot_token=Telegram.BOT_TOKEN)
+    try:
+        TelegramBot.loop.run_until_complete(server.serve(sockets=sockets))
+    finally:
+        TelegramBot.loop.run_until_complete(TelegramBot.disconnect())
+
+class WebWorkers:
+    """Serves HTTP from `count` processes sharing one listening socket, restarting any that exit"""
+
+    def __init__(self, count: int, check_interval: float = 5, shutdown_timeout: float = 40):
+        self._count = count
+        self._check_interval = check_interval
+        self._shutdown_timeout = shutdown_timeout
+        self._sockets: list[list[socket]] = []
+        self._processes: list[BaseProcess] = []
+        self._task: Task | None = None
+
+    def _spawn(self, index: int) -> BaseProcess:
+        # Read by bot.config when the new interpreter imports it
+        environ['WEB_WORKER_INDEX'] = str(index)
+        try:
+            process = get_context('spawn').Process(target=serve_worker, args=(self._sockets[index],), name=f'web-{index}')
+            process.start()
+        finally:
+            del environ['WEB_WORKER_INDEX']
+
+        logger.info(f'Web worker {index} started with pid {process.pid}')
+        return process
+
+    async def _watch(self):
+        while True:
+            await sleep(self._check_interval)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.warning(f'Web worker {index} exited with code {process.exitcode}, restarting')
+                    self._processes[index] = self._spawn(index)
+
+    def start(self):
+        if self._task is not None:
+            return
+
+        if not Server.SECRET_KEY:
+            # Workers must agree on the key; without a configured one, logins still end with this process
+            logger.warning('SECRET_KEY is not set, sessions will not survive a restart')
+            environ['SECRET_KEY'] = token_hex(32)
+
+        public = server.config.bind_socket()
+        for index in range(self._count):
+            # Siblings forward requests for state this worker holds to its private port
+            private = Config(app=instance, host='127.0.0.1', port=Server.WORKER_PORT + index).bind_socket()
+            self._sockets.append([public, private])
+
+        self._processes = [self._spawn(index) for index in range(self._count)]
+        self._task = create_task(self._watch())
+
+    async def stop(self):
+        """Let every worker shut down gracefully, killing those that take too long"""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+        self._task = None
+
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            await to_thread(process.join, self._shutdown_timeout)
+            if process.is_alive():
+                process.kill()
+        self._processes = []
+
+web_workers = WebWorkers(Server.WEB_WORKERS)
+
+async def start_bot_process():
+    """Prepare the bot process to run next to separate web workers"""
+    await init_db()
+    listener.start()
+    upload_queue.start()
+    web_workers.start()
+    # systemd stops the service with SIGTERM; end run_until_disconnected so workers are stopped too
+    get_running_loop().add_signal_handler(SIGTERM, lambda: create_task(TelegramBot.disconnect()))
+
+async def stop_bot_process():
+    await web_workers.stop()
+    await upload_queue.stop()
+    await listener.stop()
+    await close_db()